@@ -60,7 +60,22 @@ import concurrent.futures
 import ipaddress
 import tqdm
 import random
-import ipaddress
+import json
+import math
+import threading
+import itertools
+import bisect
+import cProfile
+import pstats
+import http.server
+import socket
+import multiprocessing
+import urllib3
+import collections
+import csv
+import hashlib
+import urllib.parse
+import nios_csv_import
 
 
 def parseargs():
@@ -74,16 +89,72 @@ def parseargs():
         Returns parsed arguments
     '''
     parse = argparse.ArgumentParser(description='Test API DNS Object creation in NIOS')
-    parse.add_argument('-c', '--config', type=str, default='gm.ini',
-                        help="Override ini file")
+    parse.add_argument('-c', '--config', type=str, nargs='+',
+                        default=[ 'gm.ini' ],
+                        help="Override ini file, several run the workload against each grid concurrently")
+    parse.add_argument('--members', type=str, nargs='+',
+                        help="Run a read workload against each of these members concurrently")
     parse.add_argument('-r', '--record_type', type=str, default="host",
-                        help="Specify Object Type [host, a, cname, networks]")
+                        help="Specify Object Type [host, a, cname, networks, aaaa, host6, host6_nextip, networks6, fixedaddress, reservation, dhcp_range, fixed_mac, modify, delete_hosts, read]")
     parse.add_argument('-z', '--basezone', type=str, default="apitest.poc",
                         help="Specify base zone for objects")
-    parse.add_argument('-n', '--number', type=int, default=1,
-                        help="Number of Objects to create")
+    parse.add_argument('-n', '--number', type=int,
+                        help="Number of Objects to create (default 1)")
     parse.add_argument('-t', '--threads', type=int, default=5,
                         help="Number of Objects to create")
+    parse.add_argument('-b', '--batch', type=int, default=1,
+                        help="Objects per WAPI multi-object request")
+    parse.add_argument('--rate', type=float, default=0,
+                        help="Target API calls per second (0 = unpaced)")
+    parse.add_argument('--max-rps', type=float, default=0,
+                        help="Hard ceiling on API calls per second per grid (token bucket)")
+    parse.add_argument('--burst', type=int, default=1,
+                        help="Calls allowed above --max-rps after idle time")
+    parse.add_argument('--duration', type=str,
+                        help="Run for a time (e.g. 1800, 30m, 8h) instead of --number objects")
+    parse.add_argument('-w', '--warmup', type=warmup_arg,
+                        help="Warm-up calls (e.g. 200) or time (e.g. 30s, 2m) excluded from results")
+    parse.add_argument('-s', '--scenario', type=str,
+                        help="Run weighted operation mix from scenario file")
+    parse.add_argument('--zones', type=int, default=0,
+                        help="Spread objects across this many shard zones under the base zone")
+    parse.add_argument('--shard-by', type=str, default='round-robin',
+                        choices=[ 'round-robin', 'hash' ],
+                        help="How objects are assigned to --zones shards")
+    parse.add_argument('--shard-views', action='store_true',
+                        help="Give each --zones shard its own network and DNS view")
+    parse.add_argument('--verify', action='store_true',
+                        help="After the run, bulk read the objects back and report missing, extra and duplicate IP objects")
+    parse.add_argument('--verify-only', action='store_true',
+                        help="Only verify objects 1 to --number of the type, without creating them")
+    parse.add_argument('--checkpoint', type=str,
+                        help="Periodically record completed objects in this file (default <type>_checkpoint.json)")
+    parse.add_argument('--resume', action='store_true',
+                        help="Skip objects completed in the checkpoint")
+    parse.add_argument('--csv-import', action='store_true',
+                        help="Compare CSV import with WAPI calls for the object type")
+    parse.add_argument('--csv-file', type=str,
+                        help="CSV file to generate for --csv-import")
+    parse.add_argument('--capture', type=str,
+                        help="Log every request sent to this JSONL file")
+    parse.add_argument('--replay', type=str,
+                        help="Replay a --capture log against the grid")
+    parse.add_argument('--speed', type=float, default=1.0,
+                        help="Replay speed factor (e.g. 2 = twice as fast, 0 = as fast as possible)")
+    parse.add_argument('--health', type=float, default=0,
+                        help="Sample GM member status and object counts every N seconds alongside the run")
+    parse.add_argument('--health-out', type=str,
+                        help="Write the combined health and throughput timeline to this CSV file")
+    parse.add_argument('--selftest', action='store_true',
+                        help="Measure the client's own ceiling against a local null WAPI responder")
+    parse.add_argument('--selftest-threads', type=str, default='1,5,20,50',
+                        help="Comma separated thread counts for --selftest")
+    parse.add_argument('--http-timing', action='store_true',
+                        help="Report connect, TLS, send, time to first byte and download per call")
+    parse.add_argument('--profile', action='store_true',
+                        help="Profile the client and split call time into build, queue, CPU, socket (GM) and client contention time")
+    parse.add_argument('--profile-out', type=str,
+                        help="Write raw profile data (pstats) to this file, implies --profile")
     parse.add_argument('-d', '--debug', action='store_true', 
                         help="Enable debug messages")
 
@@ -105,7 +176,7 @@ def read_ini(ini_filename):
     cfg = configparser.ConfigParser()
     config = {}
     ini_keys = ['gm', 'api_version', 'valid_cert', 'user', 
-                'pass', 'network', 'sleep']
+                'pass', 'network', 'network6', 'sleep']
 
     # Attempt to read api_key from ini file
     try:
@@ -130,8 +201,111 @@ def read_ini(ini_filename):
     return config
 
 
+# Per request HTTP phase timing, see enable_http_timing
+_http_timing = { 'enabled': False }
+
+# HTTP phases, time spent per request in seconds:
+#   connect:  TCP connection set up (0 when a kept-alive connection is reused)
+#   tls:      TLS handshake
+#   send:     writing the request
+#   ttfb:     waiting for the status line and headers (GM processing)
+#   download: reading the response body
+HTTP_PHASES = [ 'connect', 'tls', 'send', 'ttfb', 'download' ]
+
+
+def enable_http_timing():
+    '''
+    Time the HTTP phases of every request, see TimedHTTPAdapter
+    '''
+    _http_timing['enabled'] = True
+
+    return
+
+
+def http_phases():
+    '''
+    HTTP phase timings of the current thread's request
+    '''
+    if not hasattr(_thread_local, 'http_phases'):
+        _thread_local.http_phases = dict.fromkeys(HTTP_PHASES, 0.0)
+
+    return _thread_local.http_phases
+
+
+class TimedConnectionMixin:
+    '''
+    Record connect, TLS, send and time to first byte of a connection
+    into the thread's http_phases
+    '''
+    def _new_conn(self):
+        start = time.perf_counter()
+        conn = super()._new_conn()
+        http_phases()['connect'] += time.perf_counter() - start
+        return conn
+
+    def connect(self):
+        phases = http_phases()
+        before = phases['connect']
+        start = time.perf_counter()
+        super().connect()
+        # Whatever connect() took beyond the TCP connect is TLS
+        phases['tls'] += ( time.perf_counter() - start
+                         - (phases['connect'] - before) )
+
+    def request(self, *args, **kwargs):
+        phases = http_phases()
+        before = phases['connect'] + phases['tls']
+        start = time.perf_counter()
+        super().request(*args, **kwargs)
+        # http.client may connect lazily from within request()
+        phases['send'] += ( time.perf_counter() - start
+                          - (phases['connect'] + phases['tls'] - before) )
+
+    def getresponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        http_phases()['ttfb'] += time.perf_counter() - start
+        return response
+
+
+class TimedHTTPConnection(TimedConnectionMixin,
+                          urllib3.connection.HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin,
+                           urllib3.connection.HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    '''
+    Transport adapter whose connections record HTTP phase timings
+    '''
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool }
+
+
 def create_session(config):
     '''
+    Create a WAPI session
+
+    Parameters:
+        config (dict): ini configuration
+
+    Returns:
+        wapi_session (requests.Session): authenticated session
     '''
     headers = { 'content-type': "application/json" }
 
@@ -149,103 +323,32 @@ def create_session(config):
     wapi_session.verify = valid_cert
     wapi_session.headers = headers
 
-    return wapi_session
-
-
-def wapi_call(session, hostname, **params):
-    '''
-    '''
-    response = session.post(**params)
-    if response.status_code == 201:
-        result = hostname + ': Success'
+    # Each worker owns its session so a single kept-alive connection
+    # per session is all that is needed
+    if _http_timing['enabled']:
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=1)
     else:
-        result = hostname + ': Failed :' + response.text
-
-    return result
-
-def make_wapi_calls(sessions, hostnames, url, body):
-    '''
-    '''
-    results = []
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=1)
+    wapi_session.mount('https://', adapter)
+    wapi_session.mount('http://', adapter)
 
-    for z in range(0, 4):
-        results.append(wapi_call(sessions[z], hostnames[z], url=url, data=body[z]))
-
-    return results
+    return wapi_session
 
 
-def create_hosts(config, base_zone, n, threads=20):
-    '''
+def wapi_url(config, wapi_object):
     '''
-    time = 0
-    results = []
-    sessions = []
-    hostname = []
-    body = []
-    tasks = []
-
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/record:host' )
-
-    for i in range(0, 5):
-        sessions.append(create_session(config))
-
-    start = datetime.datetime.now()
-    with tqdm.tqdm(total=n) as pbar:
-        for i in range(1, n+1, 5):
-            hostnames = []
-            body = []
-            for x in range(0, 4):
-                host = 'host' + str(i+x) + '.' + base_zone
-                hostnames.append(host)
-                data = ( '{'
-                            + '"name": "' + host + '",'
-                            + '"ipv4addrs": ['
-                            + '{'
-                                + '"ipv4addr": {'
-                                + '"_object_function": "next_available_ip",'
-                                + '"_object": "network",'
-                                + '"_object_parameters": {'
-                                + '    "network": "' + config['network'] + '"'
-                                + '},'
-                                + ' "_result_field": "ips",'
-                                + ' "_parameters": {'
-                                + '     "num": 1'
-                                + '}'
-                                + '}'
-                            + '}'
-                            +']'
-                        + '}' )
-                body.append(data)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-                for z in range(0, 4):
-                    tasks.append(executor.submit(wapi_call, session=sessions[z], hostname=hostnames[z], url=url, data=body[z]))
-
-            pbar.update(5)
-
-            
-        '''
-        for future in concurrent.futures.as_completed(futures):
-            print(future.result(), end='\r', flush=True)
-        if response.status_code == 201:
-            print("Created host: {}".format(hostname), end='\r', flush=True)
-        else:
-            print ("Resposne Code: {}".format(response.status_code))
-            print ("Response Text: {}".format(response.text))
-        '''
+    Build the WAPI URL for an object or function
 
-    end = datetime.datetime.now()
-    print()
-    for task in concurrent.futures.as_completed(tasks):
-        # print("Result for host: {} ".format(future.result()), end='\r', flush=True)
-        print("Result for host: {} ".format(task.result()))
-    print()
-    print("Start Time: {}".format(start))
-    print("End Time: {}".format(end))
-    time = end - start
+    Parameters:
+        config (dict): ini configuration
+        wapi_object (str): WAPI object, reference or function path
 
-    return time
+    Returns:
+        url (str): Fully qualified WAPI URL
+    '''
+    return ( config.get('scheme', 'https') + '://' + config['gm'] + '/wapi/'
+           + config['api_version'] + '/' + wapi_object )
 
 
 def gen_mac(prefix=[], separator=''):
@@ -266,491 +369,2921 @@ def gen_mac(prefix=[], separator=''):
     return separator.join(f'{e:02x}' for e in macaddr)
     
 
-def add_macs_to_hosts(config, base_zone, n, threads=20):
+def get_netview(config):
     '''
+    Network view used for network objects
     '''
-    time = 0
-    results = []
-    sessions = []
-    hostname = []
-    body = []
-    tasks = []
+    if 'netview' in config.keys():
+        netview = config['netview']
+    else:
+        netview = 'CM-API-Test'
 
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/request' )
+    return netview
 
-    for i in range(0, 5):
-        sessions.append(create_session(config))
-    
-    # Create subnet and get IP addresses
-    subnet = ipaddress.ip_network(config['network'])
-    ips = subnet.hosts()
-
-    start = datetime.datetime.now()
-    with tqdm.tqdm(total=n) as pbar:
-        for i in range(1, n+1, 5):
-            hostnames = []
-            body = []
-            for x in range(0, 4):
-                host = 'host' + str(i+x) + '.' + base_zone
-                hostnames.append(host)
-
-                # Gen random MAC and get next IP
-                mac_addr = gen_mac()
-                ip = str(next(ips))
-            
-                data = ( '[ {'
-                            + '"method": "STATE:ASSIGN",'
-                            + '"data": {'
-                                     + '"ip_addr": "' + ip + '"'
-                              +'}'
-                         + '},'
-                         + '{'
-                             + '"method": "GET",'
-                             + '"object": "record:host_ipv4addr",'
-                             + '"data": {'
-                                      + '"ipv4addr": "##STATE:ip_addr:##"'
-                             + '},'
-                             + '"args": { "_max_results": "1" },'
-                             + '"assign_state": {'
-                                   + '"ip_ref": "_ref"'
-                             + '},'
-                             + '"enable_substitution": true,'
-                             + '"discard": true'
-                         + '},'
-                         + '{'
-                             + '"method": "PUT",'
-                             + '"object": "##STATE:ip_ref:##",'
-                             + '"enable_substitution": true,'
-                             + '"data": {'
-                                  + '"mac": "' + mac_addr + '"'
-                             + '},'
-                             + '"discard": true'
-                         + '},'
-                         + '{'
-                             + '"method": "STATE:DISPLAY"'
-                         + '}'
-                       + ']' )
-                body.append(data)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-                for z in range(0, 4):
-                    tasks.append(executor.submit(wapi_call, session=sessions[z], hostname=hostnames[z], url=url, data=body[z]))
-
-            pbar.update(5)
-
-            
-        '''
-        for future in concurrent.futures.as_completed(futures):
-            print(future.result(), end='\r', flush=True)
-        if response.status_code == 201:
-            print("Created host: {}".format(hostname), end='\r', flush=True)
-        else:
-            print ("Resposne Code: {}".format(response.status_code))
-            print ("Response Text: {}".format(response.text))
-        '''
 
-    end = datetime.datetime.now()
-    print()
-    for task in concurrent.futures.as_completed(tasks):
-        # print("Result for host: {} ".format(future.result()), end='\r', flush=True)
-        print("Result for host: {} ".format(task.result()))
-    print()
-    print("Start Time: {}".format(start))
-    print("End Time: {}".format(end))
-    time = end - start
+def create_net_view(config):
+    '''
+    Create a network view
+    '''
+    netview = get_netview(config)
+    body = { 'name': netview }
 
+    wapi_session = create_session(config)
+    response = wapi_session.post(wapi_url(config, 'networkview'),
+                                 data=json.dumps(body))
+    if response.status_code == 201:
+        print("Created network view: {}".format(netview))
+        status = True
+    else:
+        status = False
+        print ("Error occured: {}".format(response.text))
     
-    return time
+    return status
 
 
-def delete_hosts(config, base_zone, n, threads=20):
+def create_container(config, ipv6=False):
     '''
+    Create a network container for config['network'], or
+    config['network6'] with ipv6
     '''
-    time = 0
-    results = []
-    sessions = []
-    hostname = []
-    body = []
-    tasks = []
-
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/request' )
+    if ipv6:
+        network, container = config['network6'], 'ipv6networkcontainer'
+    else:
+        network, container = config['network'], 'networkcontainer'
+    body = { 'network': network,
+             'network_view': get_netview(config) }
 
-    for i in range(0, 5):
-        sessions.append(create_session(config))
+    wapi_session = create_session(config)
+    response = wapi_session.post(wapi_url(config, container),
+                                 data=json.dumps(body))
+    if response.status_code == 201:
+        print("Created network container {}".format(network))
+        status = True
+    else:
+        status = False
+        print ("Error occured: {}".format(response.text))
     
-    start = datetime.datetime.now()
-    with tqdm.tqdm(total=n) as pbar:
-        for i in range(1, n+1, 5):
-            hostnames = []
-            body = []
-            for x in range(0, 4):
-                host = 'host' + str(i+x) + '.' + base_zone
-                hostnames.append(host)
-
-                data = ( '[ {'
-                            + '"method": "STATE:ASSIGN",'
-                            + '"data": {'
-                                     + '"host_name": "' + host + '"'
-                              +'}'
-                         + '},'
-                         + '{'
-                             + '"method": "GET",'
-                             + '"object": "record:host",'
-                             + '"data": {'
-                                      + '"name": "##STATE:host_name:##"'
-                             + '},'
-                             + '"args": { "_max_results": "1" },'
-                             + '"assign_state": {'
-                                   + '"host_ref": "_ref"'
-                             + '},'
-                             + '"enable_substitution": true,'
-                             + '"discard": true'
-                         + '},'
-                         + '{'
-                             + '"method": "DELETE",'
-                             + '"object": "##STATE:host_ref:##",'
-                             + '"enable_substitution": true,'
-                             + '"discard": true'
-                         + '},'
-                         + '{'
-                             + '"method": "STATE:DISPLAY"'
-                         + '}'
-                       + ']' )
-                body.append(data)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-                for z in range(0, 4):
-                    tasks.append(executor.submit(wapi_call, session=sessions[z], hostname=hostnames[z], url=url, data=body[z]))
-
-            pbar.update(5)
-
-            
-        '''
-        for future in concurrent.futures.as_completed(futures):
-            print(future.result(), end='\r', flush=True)
-        if response.status_code == 201:
-            print("Created host: {}".format(hostname), end='\r', flush=True)
-        else:
-            print ("Resposne Code: {}".format(response.status_code))
-            print ("Response Text: {}".format(response.text))
-        '''
+    return status
 
-    end = datetime.datetime.now()
-    print()
-    for task in concurrent.futures.as_completed(tasks):
-        # print("Result for host: {} ".format(future.result()), end='\r', flush=True)
-        print("Result for host: {} ".format(task.result()))
-    print()
-    print("Start Time: {}".format(start))
-    print("End Time: {}".format(end))
-    time = end - start
 
-    
-    return time
+def setup_networks(config, options):
+    '''
+    Create the network view and container used by network workloads
+    '''
+    create_net_view(config)
+    create_container(config)
 
+    return
 
-def create_networks(config, n, threads=20):
+
+def create_zone(config, zone, view=None):
     '''
+    Create an authoritative zone, optionally in a DNS view
     '''
-    time = 0
-    results = []
-    sessions = []
-    hostname = []
-    body = []
-    tasks = []
+    body = { 'fqdn': zone }
+    if view:
+        body['view'] = view
+
+    wapi_session = create_session(config)
+    response = wapi_session.post(wapi_url(config, 'zone_auth'),
+                                 data=json.dumps(body))
+    if response.status_code == 201:
+        print("Created zone {}".format(zone))
+        status = True
+    else:
+        status = False
+        print ("Error occured: {}".format(response.text))
 
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/network' )
+    return status
 
-    net = ipaddress.ip_network(config['network'])
-    subnets = list(net.subnets(new_prefix=24))
 
-    if 'netview' in config.keys():
-        netview = config['netview']
+def setup_host_network(config, options):
+    '''
+    Create config['network'] in the configured network view for next
+    available IP host records
+    '''
+    body = { 'network': config['network'],
+             'network_view': get_netview(config) }
+
+    wapi_session = create_session(config)
+    response = wapi_session.post(wapi_url(config, 'network'),
+                                 data=json.dumps(body))
+    if response.status_code == 201:
+        print("Created network {} in {}".format(config['network'],
+                                                 get_netview(config)))
     else:
-        netview = 'CM-API-Test'
+        print ("Error occured: {}".format(response.text))
 
-    for i in range(0, 5):
-        sessions.append(create_session(config))
+    return
 
-    start = datetime.datetime.now()
-    try:
-        create_net_view(config)
-        create_container(config)
-    
-        with tqdm.tqdm(total=n) as pbar:
-            position = 0
-            for i in range(1, n+1, 5):
-                networks = []
-                body = []
-                for x in range(0, 4):
-                    network = str(subnets[ position + x ])
-                    networks.append(network)
-                    data = ( '{'
-                                + '"network": "' + network + '",'
-                                + '"network_view": "' + netview + '",'
-                                + '"extattrs": { "Building": { "value": "Lab" } }'
-                            + '}' )
-                    body.append(data)
-                position += 5
-
-                with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-                    for z in range(0, 4):
-                        tasks.append(executor.submit(wapi_call, session=sessions[z], hostname=networks[z], url=url, data=body[z]))
-
-                pbar.update(5)
-
-                
-            '''
-            for future in concurrent.futures.as_completed(futures):
-                print(future.result(), end='\r', flush=True)
-            if response.status_code == 201:
-                print("Created host: {}".format(hostname), end='\r', flush=True)
-            else:
-                print ("Resposne Code: {}".format(response.status_code))
-                print ("Response Text: {}".format(response.text))
-            '''
 
-        end = datetime.datetime.now()
-        print()
-        for task in concurrent.futures.as_completed(tasks):
-            # print("Result for host: {} ".format(future.result()), end='\r', flush=True)
-            print("Result for host: {} ".format(task.result()))
-        print()
-        print("Start Time: {}".format(start))
-        print("End Time: {}".format(end))
-        time = end - start
-    
-    except:
-        print("problem occured")
+def setup_networks6(config, options):
+    '''
+    Create the network view and IPv6 container used by networks6
+    '''
+    create_net_view(config)
+    create_container(config, ipv6=True)
 
-    return time
+    return
 
 
-def create_net_view(config):
+def setup_host6(config, options):
     '''
-    Create a network view
+    Create the first /64 of config['network6'] in the default network
+    view for IPv6 next available IP host records
     '''
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/networkview' )
-    
-    if config['valid_cert'] == 'true':
-        valid_cert = True
+    network = str(nth_subnet(config['network6'], 64, 1))
+    wapi_session = create_session(config)
+    response = wapi_session.post(wapi_url(config, 'ipv6network'),
+                                 data=json.dumps({ 'network': network }))
+    if response.status_code == 201:
+        print("Created IPv6 network {}".format(network))
     else:
-        valid_cert = False
+        print ("Error occured: {}".format(response.text))
+
+    return
 
+
+def nth_subnet(network, prefixlen, index):
+    '''
+    The index'th (from 1) subnet of size prefixlen within network
+
+    Computed arithmetically, the parent is never enumerated, so this
+    works equally for /24s of an IPv4 /8 and /64s of an IPv6 /32.
+    '''
+    net = ipaddress.ip_network(network)
+    size = 2 ** (net.max_prefixlen - prefixlen)
+    if index < 1 or index > net.num_addresses // size:
+        raise IndexError('No /{} number {} in {}'.format(prefixlen, index, net))
+
+    return ipaddress.ip_network((net.network_address + (index - 1) * size,
+                                 prefixlen))
+
+
+def host_body(config, index, options):
+    '''
+    Host record using next available IP from config['network']
+    '''
+    host = 'host' + str(index) + '.' + options['base_zone']
+    network = { 'network': config['network'] }
     if 'netview' in config.keys():
-        netview = config['netview']
-    else:
-        netview = 'CM-API-Test'
-    
-    body = '{ "name": "' + netview + '" }'
+        network['network_view'] = config['netview']
+    data = { 'name': host,
+             'ipv4addrs': [ { 'ipv4addr': {
+                 '_object_function': 'next_available_ip',
+                 '_object': 'network',
+                 '_object_parameters': network,
+                 '_result_field': 'ips',
+                 '_parameters': { 'num': 1 } } } ] }
 
-    wapi_session = requests.session()
-    wapi_session.auth = (config['user'], config['pass'])
-    wapi_session.verify = valid_cert
+    return host, data
 
-    headers = { 'content-type': "application/json" }
 
-    response = wapi_session.post(url, data=body, headers=headers)
-    if response.status_code == requests.codes.ok:
-        print("Create host: {}".format(hostname))
-        status = True
-    else:
-        status = False
-        print ("Error occured: {}".format(response.text))
-    
-    return status
+def a_record_body(config, index, options):
+    '''
+    A record using the index'th address of config['network']
+    '''
+    host = 'ahost' + str(index) + '.' + options['base_zone']
+    ip = str(ipaddress.ip_network(config['network'])[index])
+    data = { 'name': host, 'ipv4addr': ip }
+
+    return host, data
 
 
-def create_container(config):
+def cname_body(config, index, options):
     '''
-    Create a network view
+    CNAME record pointing at host record index
     '''
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/networkcontainer' )
-    
-    if config['valid_cert'] == 'true':
-        valid_cert = True
-    else:
-        valid_cert = False
+    alias = 'cname' + str(index) + '.' + options['base_zone']
+    data = { 'name': alias,
+             'canonical': 'host' + str(index) + '.' + options['base_zone'] }
 
-    if 'netview' in config.keys():
-        netview = config['netview']
-    else:
-        netview = 'CM-API-Test'
-    
-    body = ( '{ "network": "' + config['network'] + '",' 
-            + ' "network_view": "' + netview + '" }' )
+    return alias, data
 
-    wapi_session = requests.session()
-    wapi_session.auth = (config['user'], config['pass'])
-    wapi_session.verify = valid_cert
 
-    headers = { 'content-type': "application/json" }
+def network_body(config, index, options):
+    '''
+    The index'th /24 of config['network'] in the test network view
+    '''
+    network = str(nth_subnet(config['network'], 24, index))
+    data = { 'network': network,
+             'network_view': get_netview(config),
+             'extattrs': { 'Building': { 'value': 'Lab' } } }
 
-    response = wapi_session.post(url, data=body, headers=headers)
-    if response.status_code == requests.codes.ok:
-        print("Created network container")
-        status = True
-    else:
-        status = False
-        print ("Error occured: {}".format(response.text))
-    
-    return status
+    return network, data
 
 
-def create_cnames(config, base_zone, n, threads=20):
+def aaaa_record_body(config, index, options):
     '''
+    AAAA record using the index'th address of config['network6']
     '''
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/record:cname' )
+    host = 'aaaahost' + str(index) + '.' + options['base_zone']
+    ip = str(ipaddress.ip_network(config['network6'])[index])
+    data = { 'name': host, 'ipv6addr': ip }
 
-    if config['valid_cert'] == 'true':
-        valid_cert = True
-    else:
-        valid_cert = False
+    return host, data
 
-    # Avoid error due to a self-signed cert.
-    if not valid_cert:
-        requests.packages.urllib3.disable_warnings()
-    
-    wapi_session = requests.session()
-    wapi_session.auth = (config['user'], config['pass'])
-    wapi_session.verify = valid_cert
 
-    headers = { 'content-type': "application/json" }
+def host6_body(config, index, options):
+    '''
+    Host record with the index'th address of config['network6']
+    '''
+    host = 'v6host' + str(index) + '.' + options['base_zone']
+    ip = str(ipaddress.ip_network(config['network6'])[index])
+    data = { 'name': host,
+             'ipv6addrs': [ { 'ipv6addr': ip } ] }
 
-    start = datetime.datetime.now()
-    print("Start Time: {}".format(start))
-    for i in range(1, n+1):
-        hostname = 'host' + str(i) + '.' + base_zone
-        body = ( '{'
-	                + '"name": "' + hostname + '",'
-	                + '"ipv4addrs": ['
-		            + '{'
-                        + '"ipv4addr": {'
-                        + '"_object_function": "next_available_ip",'
-                        + '"_object": "network",'
-                        + '"_object_parameters": {'
-                        + '    "network": "' + config["network"] + '"'
-                        + '},'
-                        + ' "_result_field": "ips",'
-                        + ' "_parameters": {'
-                        + '     "num": 1'
-                        + '}'
-                        + '}'
-                    + '}'
-                    +']'
-                + '}' )
-
-        response = wapi_session.post(url, data=body, headers=headers)
-        if response.status_code == requests.codes.ok:
-            print("Create host: {}".format(hostname))
-        else:
-            status = 'WAPI_ERROR'
-            print ("Error occured: {}".format(response.text))
-    
-    end = datetime.datetime.now()
-    print("End Time: {}".format(end))
-    time = end - start
+    return host, data
+
+
+def host6_nextip_body(config, index, options):
+    '''
+    Host record using next available IP from the first /64 of
+    config['network6']
+    '''
+    host = 'v6nhost' + str(index) + '.' + options['base_zone']
+    network = str(nth_subnet(config['network6'], 64, 1))
+    data = { 'name': host,
+             'ipv6addrs': [ { 'ipv6addr': {
+                 '_object_function': 'next_available_ip',
+                 '_object': 'ipv6network',
+                 '_object_parameters': { 'network': network },
+                 '_result_field': 'ips',
+                 '_parameters': { 'num': 1 } } } ] }
 
-    return time
+    return host, data
 
 
-def create_a_records(config, base_zone, n, threads=20):
+def network6_body(config, index, options):
     '''
+    The index'th /64 of config['network6'] in the test network view
     '''
-    time = 0
-    results = []
-    sessions = []
-    hostnames = []
-    body = []
-    tasks = []
-    net = ipaddress.ip_network(config['network'])
-    ips = list(net.hosts())
-
-    url = ( 'https://' + config['gm'] + '/wapi/' 
-          + config['api_version'] + '/record:a' )
-
-    for i in range(0, 5):
-        sessions.append(create_session(config))
-
-    start = datetime.datetime.now()
-    with tqdm.tqdm(total=n) as pbar:
-        for i in range(1, n+1, 5):
-            hostnames = []
-            body = []
-            for x in range(0, 4):
-                host = 'ahost' + str(i+x) + '.' + base_zone
-                ip = str(ips[x + i])
-                hostnames.append(host)
-                data = ( '{'
-                            + '"name": "' + host + '",'
-                            + '"ipv4addr": '
-                            + '"' + ip +'"'
-                        + '}' )
-                body.append(data)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-                for z in range(0, 4):
-                    tasks.append(executor.submit(wapi_call, session=sessions[z], hostname=hostnames[z], url=url, data=body[z]))
-
-            pbar.update(5)
-
-            
-    end = datetime.datetime.now()
-    print()
-    for task in concurrent.futures.as_completed(tasks):
-        # print("Result for host: {} ".format(future.result()), end='\r', flush=True)
-        print("Result for a-record: {} ".format(task.result()))
-    print()
-    print("Start Time: {}".format(start))
-    print("End Time: {}".format(end))
-    time = end - start
+    network = str(nth_subnet(config['network6'], 64, index))
+    data = { 'network': network,
+             'network_view': get_netview(config),
+             'extattrs': { 'Building': { 'value': 'Lab' } } }
 
-    return time
+    return network, data
 
 
-def main():
+DHCP_RANGE = (10, 127)
+DHCP_FIXED = (128, 191)
+DHCP_RESERVED = (192, 254)
+
+
+def dhcp_address(config, index, block):
     '''
-    Code logic
+    The index'th address of block across the /24s of config['network']
+
+    Each /24 created by the networks workload is laid out as a DHCP
+    range (DHCP_RANGE), fixed addresses (DHCP_FIXED) and reservations
+    (DHCP_RESERVED) so the DHCP workloads never collide.
+
+    Parameters:
+        config (dict): ini configuration
+        index (int): object index from 1
+        block (tuple): first and last host offset within each /24
+
+    Returns:
+        address (str)
     '''
-    exitcode = 0
-    run_time = 0
+    per_network = block[1] - block[0] + 1
+    network = nth_subnet(config['network'], 24,
+                         (index - 1) // per_network + 1)
 
-    # Parse CLI arguments
-    args = parseargs()
-    inifile = args.config
-    n = args.number
-    base_zone = args.basezone
+    return str(network.network_address + block[0]
+               + (index - 1) % per_network)
 
-    # Read inifile
-    config = read_ini(inifile)
 
-    if args.record_type == 'host':
-        run_time = create_hosts(config, base_zone, n, threads=args.threads)
-    elif args.record_type == 'a':
-        run_time = create_a_records(config, base_zone, n, threads=args.threads)
-    elif args.record_type == 'cname':
-        run_time = create_cnames(config, base_zone, n, threads=args.threads)
-    elif args.record_type == 'networks':
-        run_time = create_networks(config, n, threads=args.threads)
-    elif args.record_type == 'modify':
-        run_time = add_macs_to_hosts(config, base_zone, n, threads=args.threads)
-    elif args.record_type == 'delete_hosts':
-        run_time = delete_hosts(config, base_zone, n, threads=args.threads)
-    else:
-        print('Object type {} not yet supported.'.format(args.record_type))
-    
-    if run_time:
-        print(f'{args.number} API calls in {run_time}')
-        ops = float(args.number) / run_time.total_seconds()
-        print(f'{ops} average calls per second')
+def fixed_address_body(config, index, options):
+    '''
+    Fixed address with a generated MAC, requires the networks workload
+    '''
+    ip = dhcp_address(config, index, DHCP_FIXED)
+    data = { 'ipv4addr': ip,
+             'mac': gen_mac(separator=':'),
+             'name': 'fixed' + str(index),
+             'network_view': get_netview(config) }
+
+    return ip, data
+
+
+def reservation_body(config, index, options):
+    '''
+    Reservation (fixed address with a zero MAC), requires the networks
+    workload
+    '''
+    ip = dhcp_address(config, index, DHCP_RESERVED)
+    data = { 'ipv4addr': ip,
+             'mac': '00:00:00:00:00:00',
+             'name': 'reserved' + str(index),
+             'network_view': get_netview(config) }
+
+    return ip, data
+
+
+def dhcp_range_body(config, index, options):
+    '''
+    DHCP range within the index'th /24 of config['network'], requires
+    the networks workload
+    '''
+    network = nth_subnet(config['network'], 24, index)
+    data = { 'start_addr': str(network.network_address + DHCP_RANGE[0]),
+             'end_addr': str(network.network_address + DHCP_RANGE[1]),
+             'network': str(network),
+             'network_view': get_netview(config) }
+
+    return str(network), data
+
+
+def fixed_mac_body(config, index, options):
+    '''
+    WAPI request to move fixed address index to a new random MAC, as a
+    client lease churning onto new hardware would
+    '''
+    ip = dhcp_address(config, index, DHCP_FIXED)
+    data = [ { 'method': 'STATE:ASSIGN',
+               'data': { 'ip_addr': ip } },
+             { 'method': 'GET',
+               'object': 'fixedaddress',
+               'data': { 'ipv4addr': '##STATE:ip_addr:##',
+                         'network_view': get_netview(config) },
+               'args': { '_max_results': '1' },
+               'assign_state': { 'fixed_ref': '_ref' },
+               'enable_substitution': True,
+               'discard': True },
+             { 'method': 'PUT',
+               'object': '##STATE:fixed_ref:##',
+               'enable_substitution': True,
+               'data': { 'mac': gen_mac(separator=':') },
+               'discard': True },
+             { 'method': 'STATE:DISPLAY' } ]
+
+    return ip, data
+
+
+def host_mac_body(config, index, options):
+    '''
+    WAPI request to set a random MAC on the host address at index, or
+    on options['host_ip'] when the address is known
+    '''
+    ip = options.get('host_ip') or str(ipaddress.ip_network(config['network'])[index])
+    data = [ { 'method': 'STATE:ASSIGN',
+               'data': { 'ip_addr': ip } },
+             { 'method': 'GET',
+               'object': 'record:host_ipv4addr',
+               'data': { 'ipv4addr': '##STATE:ip_addr:##' },
+               'args': { '_max_results': '1' },
+               'assign_state': { 'ip_ref': '_ref' },
+               'enable_substitution': True,
+               'discard': True },
+             { 'method': 'PUT',
+               'object': '##STATE:ip_ref:##',
+               'enable_substitution': True,
+               'data': { 'mac': gen_mac() },
+               'discard': True },
+             { 'method': 'STATE:DISPLAY' } ]
+
+    return ip, data
+
+
+def delete_host_body(config, index, options):
+    '''
+    WAPI request to look up and delete host record index
+    '''
+    host = 'host' + str(index) + '.' + options['base_zone']
+    data = [ { 'method': 'STATE:ASSIGN',
+               'data': { 'host_name': host } },
+             { 'method': 'GET',
+               'object': 'record:host',
+               'data': { 'name': '##STATE:host_name:##' },
+               'args': { '_max_results': '1' },
+               'assign_state': { 'host_ref': '_ref' },
+               'enable_substitution': True,
+               'discard': True },
+             { 'method': 'DELETE',
+               'object': '##STATE:host_ref:##',
+               'enable_substitution': True,
+               'discard': True },
+             { 'method': 'STATE:DISPLAY' } ]
+
+    return host, data
+
+
+def read_hosts_params(config, index, options):
+    '''
+    Query parameters for a single paged read of host records
+    '''
+    label = 'page' + str(index)
+    params = { 'zone': options['base_zone'],
+               '_return_fields': 'name',
+               '_paging': 1,
+               '_max_results': 100,
+               '_return_as_object': 1 }
 
+    return label, params
+
+
+def host_csv_row(config, index, options):
+    '''
+    CSV import row for host record index using the index'th address
+    '''
+    host = 'host' + str(index) + '.' + options['base_zone']
+    ip = str(ipaddress.ip_network(config['network'])[index])
 
+    return [ 'hostrecord', host, ip, 'TRUE' ]
+
+
+def a_record_csv_row(config, index, options):
+    '''
+    CSV import row for A record index
+    '''
+    host, data = a_record_body(config, index, options)
+
+    return [ 'arecord', host, data['ipv4addr'] ]
+
+
+def cname_csv_row(config, index, options):
+    '''
+    CSV import row for CNAME record index
+    '''
+    alias, data = cname_body(config, index, options)
+
+    return [ 'cnamerecord', alias, data['canonical'] ]
+
+
+def network_csv_row(config, index, options):
+    '''
+    CSV import row for network index
+    '''
+    network, data = network_body(config, index, options)
+    net = ipaddress.ip_network(network)
+
+    return [ 'network', str(net.network_address), str(net.netmask),
+             data['network_view'] ]
+
+
+def fixed_address_csv_row(config, index, options):
+    '''
+    CSV import row for fixed address index
+    '''
+    ip, data = fixed_address_body(config, index, options)
+
+    return [ 'fixedaddress', ip, data['mac'], data['network_view'] ]
+
+
+def reservation_csv_row(config, index, options):
+    '''
+    CSV import row for reservation index
+    '''
+    ip, data = reservation_body(config, index, options)
+
+    return [ 'fixedaddress', ip, data['mac'], data['network_view'] ]
+
+
+def dhcp_range_csv_row(config, index, options):
+    '''
+    CSV import row for DHCP range index
+    '''
+    network, data = dhcp_range_body(config, index, options)
+
+    return [ 'dhcprange', data['start_addr'], data['end_addr'],
+             data['network_view'] ]
+
+
+def aaaa_record_csv_row(config, index, options):
+    '''
+    CSV import row for AAAA record index
+    '''
+    host, data = aaaa_record_body(config, index, options)
+
+    return [ 'aaaarecord', host, data['ipv6addr'] ]
+
+
+def network6_csv_row(config, index, options):
+    '''
+    CSV import row for IPv6 network index
+    '''
+    network, data = network6_body(config, index, options)
+    net = ipaddress.ip_network(network)
+
+    return [ 'ipv6network', str(net.network_address), str(net.prefixlen),
+             data['network_view'] ]
+
+
+def zone_scope(config, options, view=None):
+    '''
+    Paged read parameters for the objects of a zone
+    '''
+    params = { 'zone': options['base_zone'] }
+    if view:
+        params['view'] = view
+
+    return params
+
+
+def network_scope(config, options, view=None):
+    '''
+    Paged read parameters for the networks of the network view
+    '''
+    return { 'network_view': get_netview(config) }
+
+
+def check_status(job, response):
+    '''
+    Default response handler, success if the status code is expected
+    '''
+    if response.status_code in job['codes']:
+        return True, ''
+    else:
+        return False, response.text
+
+
+def check_created(job, response):
+    '''
+    Response handler for creates with _return_fields, keeps the
+    returned object(s) JSON as text for callbacks
+    '''
+    success, text = check_status(job, response)
+    if success:
+        text = response.text
+
+    return success, text
+
+
+def check_read(job, response):
+    '''
+    Response handler for paged reads, expects a result list
+    '''
+    success, text = check_status(job, response)
+    if success and 'result' not in response.json():
+        success, text = False, response.text
+
+    return success, text
+
+
+# Workload registry, each object type supplies:
+#   object:  WAPI object (or 'request' for multi-object bodies)
+#   method:  HTTP method
+#   payload: func(config, index, options) returning (label, body)
+#   codes:   HTTP status codes counted as success
+#   handler: optional response handler, defaults to check_status
+#   return_fields: optional _return_fields for the created object,
+#            only requested when options['return_fields'] is set
+#   setup:   optional func(config, options) run once before the workload
+#   view_setup: optional func(config, options) run per shard view
+#   csv:     optional (header, func(config, index, options)) for CSV import
+#   verify:  optional post-run check, see verify_workload
+WORKLOADS = {
+    'host': { 'object': 'record:host', 'method': 'POST',
+              'payload': host_body, 'codes': (201,),
+              'return_fields': 'ipv4addrs',
+              'view_setup': setup_host_network,
+              'verify': { 'scope': zone_scope, 'fields': 'name,ipv4addrs',
+                          'key': lambda o: o['name'],
+                          'ips': lambda o: [ a['ipv4addr']
+                                             for a in o.get('ipv4addrs', []) ],
+                          'expected_ip': None },
+              'csv': ([ 'header-hostrecord', 'fqdn*', 'addresses',
+                        'configure_for_dns' ], host_csv_row) },
+    'a': { 'object': 'record:a', 'method': 'POST',
+           'payload': a_record_body, 'codes': (201,),
+           'verify': { 'scope': zone_scope, 'fields': 'name,ipv4addr',
+                       'key': lambda o: o['name'],
+                       'ips': lambda o: [ o['ipv4addr'] ],
+                       'expected_ip': lambda body: body['ipv4addr'] },
+           'csv': ([ 'header-arecord', 'fqdn*', 'address*' ],
+                   a_record_csv_row) },
+    'cname': { 'object': 'record:cname', 'method': 'POST',
+               'payload': cname_body, 'codes': (201,),
+               'verify': { 'scope': zone_scope, 'fields': 'name',
+                           'key': lambda o: o['name'],
+                           'ips': lambda o: [],
+                           'expected_ip': None },
+               'csv': ([ 'header-cnamerecord', 'fqdn*', 'canonical_name*' ],
+                       cname_csv_row) },
+    'networks': { 'object': 'network', 'method': 'POST',
+                  'payload': network_body, 'codes': (201,),
+                  'verify': { 'scope': network_scope, 'fields': 'network',
+                              'key': lambda o: o['network'],
+                              'ips': lambda o: [],
+                              'expected_ip': None },
+                  'setup': setup_networks,
+                  'csv': ([ 'header-network', 'address*', 'netmask*',
+                            'network_view' ], network_csv_row) },
+    'aaaa': { 'object': 'record:aaaa', 'method': 'POST',
+              'payload': aaaa_record_body, 'codes': (201,),
+              'verify': { 'scope': zone_scope, 'fields': 'name,ipv6addr',
+                          'key': lambda o: o['name'],
+                          'ips': lambda o: [ o['ipv6addr'] ],
+                          'expected_ip': lambda body: body['ipv6addr'] },
+              'csv': ([ 'header-aaaarecord', 'fqdn*', 'address*' ],
+                      aaaa_record_csv_row) },
+    'host6': { 'object': 'record:host', 'method': 'POST',
+               'payload': host6_body, 'codes': (201,) },
+    'host6_nextip': { 'object': 'record:host', 'method': 'POST',
+                      'payload': host6_nextip_body, 'codes': (201,),
+                      'setup': setup_host6 },
+    'networks6': { 'object': 'ipv6network', 'method': 'POST',
+                   'payload': network6_body, 'codes': (201,),
+                   'setup': setup_networks6,
+                   'csv': ([ 'header-ipv6network', 'address*', 'cidr*',
+                             'network_view' ], network6_csv_row) },
+    'fixedaddress': { 'object': 'fixedaddress', 'method': 'POST',
+                      'payload': fixed_address_body, 'codes': (201,),
+                      'csv': ([ 'header-fixedaddress', 'ip_address*',
+                                'mac_address*', 'network_view' ],
+                              fixed_address_csv_row) },
+    'reservation': { 'object': 'fixedaddress', 'method': 'POST',
+                     'payload': reservation_body, 'codes': (201,),
+                     'csv': ([ 'header-fixedaddress', 'ip_address*',
+                               'mac_address*', 'network_view' ],
+                             reservation_csv_row) },
+    'dhcp_range': { 'object': 'range', 'method': 'POST',
+                    'payload': dhcp_range_body, 'codes': (201,),
+                    'csv': ([ 'header-dhcprange', 'start_address*',
+                              'end_address*', 'network_view' ],
+                            dhcp_range_csv_row) },
+    'fixed_mac': { 'object': 'request', 'method': 'POST',
+                   'payload': fixed_mac_body, 'codes': (200, 201) },
+    'modify': { 'object': 'request', 'method': 'POST',
+                'payload': host_mac_body, 'codes': (200, 201) },
+    'delete_hosts': { 'object': 'request', 'method': 'POST',
+                      'payload': delete_host_body, 'codes': (200, 201) },
+    'read': { 'object': 'record:host', 'method': 'GET',
+              'payload': read_hosts_params, 'codes': (200,),
+              'handler': check_read },
+}
+
+
+def read_scenario(scenario_file):
+    '''
+    Open and parse scenario ini file
+
+    A scenario describes a weighted mix of operations, e.g.
+
+        [scenario]
+        number = 10000
+        threads = 20
+        rate = 0
+        batch = 1
+        warmup = 30s
+        duration = 30m
+
+        [mix]
+        host = 50
+        a = 20
+        modify = 15
+        read = 10
+        delete_hosts = 5
+
+    An optional interarrival section gives an empirical distribution
+    of the gaps between calls, as seconds = weight, which replaces
+    rate pacing (see nios_audit_synth.py):
+
+        [interarrival]
+        0 = 120
+        0.05 = 300
+        1.2 = 40
+
+    Parameters:
+        scenario_file (str): name of scenario file
+
+    Returns:
+        scenario (dict): number, threads, rate, batch, warmup,
+                         duration, mix [(op, weight)] and
+                         interarrival [(seconds, weight)]
+    '''
+    cfg = configparser.ConfigParser()
+    scenario = { 'number': 1, 'threads': 5, 'rate': 0.0, 'batch': 1,
+                 'warmup': None, 'duration': None, 'mix': [],
+                 'interarrival': [] }
+
+    try:
+        cfg.read(scenario_file)
+    except configparser.Error as err:
+        logging.error(err)
+
+    if 'scenario' in cfg:
+        section = cfg['scenario']
+        scenario['number'] = section.getint('number', fallback=1)
+        scenario['threads'] = section.getint('threads', fallback=5)
+        scenario['rate'] = section.getfloat('rate', fallback=0.0)
+        scenario['batch'] = section.getint('batch', fallback=1)
+        scenario['warmup'] = section.get('warmup', fallback=None)
+        if scenario['warmup']:
+            try:
+                parse_warmup(scenario['warmup'])
+            except ValueError as err:
+                logging.warning('{}, ignoring.'.format(err))
+                scenario['warmup'] = None
+        scenario['duration'] = section.get('duration', fallback=None)
+    else:
+        logging.warning('No scenario section in file: {}'.format(scenario_file))
+
+    if 'mix' in cfg:
+        for op, weight in cfg['mix'].items():
+            if op in WORKLOADS:
+                scenario['mix'].append((op, float(weight)))
+            else:
+                logging.warning('Operation {} not supported, ignoring.'.format(op))
+    else:
+        logging.warning('No mix section in file: {}'.format(scenario_file))
+
+    if 'interarrival' in cfg:
+        for gap, weight in cfg['interarrival'].items():
+            try:
+                scenario['interarrival'].append((float(gap), float(weight)))
+            except ValueError:
+                logging.warning('Invalid interarrival {} = {}, ignoring.'
+                                .format(gap, weight))
+
+    return scenario
+
+
+# Per thread WAPI session used by the engine workers
+_thread_local = threading.local()
+
+# Latency histogram resolution (~5% per bucket)
+LATENCY_BASE = 1.05
+
+
+# Client-side profiling state, see enable_profiling
+_profiling = { 'enabled': False, 'profilers': [], 'lock': threading.Lock(),
+               'process_cpu': 0.0, 'wall': 0.0 }
+
+# Request phases recorded for the client overhead breakdown:
+#   build:  payload generation in the dispatcher (CPU)
+#   queue:  waiting in the executor for a free worker
+#   token:  held back by the --max-rps rate limiter
+#   cpu:    client CPU in the worker (request prep, TLS, JSON parse)
+#   socket: measured connect, TLS, send, time to first byte and
+#           download (see HTTP_PHASES), the time spent on the GM
+#   client: remaining wall time, the worker was runnable but waiting
+#           for the GIL or the OS scheduler (client contention)
+# cpu spent inside socket calls (e.g. TLS) is counted in both, so
+# client is a lower bound.
+PROFILE_PHASES = [ 'build', 'queue', 'token', 'cpu', 'socket', 'client' ]
+
+
+def enable_profiling():
+    '''
+    Profile the client, see thread_profiler and report_profile
+
+    Socket time is measured by the HTTP phase timing, which is
+    enabled too.
+    '''
+    _profiling['enabled'] = True
+    enable_http_timing()
+
+    return
+
+
+def thread_profiler():
+    '''
+    Start a deterministic profiler for the current thread, once
+    '''
+    if not _profiling['enabled'] or hasattr(_thread_local, 'profiler'):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Newer Pythons allow one profiler which covers all threads
+        profiler = None
+    _thread_local.profiler = profiler
+    if profiler:
+        with _profiling['lock']:
+            _profiling['profilers'].append(profiler)
+
+    return
+
+
+def report_profile(profile_out=None, top=20):
+    '''
+    Print the merged profile of the dispatcher and worker threads
+
+    Parameters:
+        profile_out (str): optional file for the raw pstats data
+        top (int): number of functions to print
+    '''
+    if _profiling['wall']:
+        # A saturated client shows as close to 100% of one core, the
+        # most the GIL allows Python code to use
+        print()
+        print('Client process CPU {:.1f}s in {:.1f}s measured: {:.0f}% of one core'
+              ' ({} cores available)'
+              .format(_profiling['process_cpu'], _profiling['wall'],
+                      _profiling['process_cpu'] / _profiling['wall'] * 100,
+                      os.cpu_count()))
+        if _profiling['process_cpu'] / _profiling['wall'] > 0.8:
+            print('The client is CPU bound, socket times include waiting for'
+                  ' the GIL; use fewer threads or compare with --selftest')
+    profilers = _profiling['profilers']
+    if not profilers:
+        return
+    for profiler in profilers:
+        profiler.disable()
+    profile_stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        profile_stats.add(profiler)
+    print()
+    print('Client profile ({} threads):'.format(len(profilers)))
+    profile_stats.sort_stats('cumulative').print_stats(top)
+    if profile_out:
+        profile_stats.dump_stats(profile_out)
+        print('Profile data written to {}'.format(profile_out))
+
+    return
+
+
+# Request capture state, see enable_capture
+_capture = { 'file': None, 'lock': threading.Lock() }
+
+
+def enable_capture(capture_file):
+    '''
+    Log every measured request to capture_file as JSON lines of
+    time, op, method, object, URL query args and body, written as the
+    request is sent. Warm-up calls are not captured.
+    '''
+    _capture['file'] = open(capture_file, 'w')
+
+    return
+
+
+def close_capture():
+    '''
+    Close the capture log, if any
+    '''
+    if _capture['file']:
+        _capture['file'].close()
+        _capture['file'] = None
+
+    return
+
+
+def capture_request(job):
+    '''
+    Append a job to the capture log at send time
+    '''
+    line = json.dumps({ 'time': time.time(),
+                        'op': job['op'],
+                        'method': job['method'],
+                        'object': job['object'],
+                        'args': dict(urllib.parse.parse_qsl(
+                                     urllib.parse.urlsplit(job['url']).query)),
+                        'body': job['body'] })
+    with _capture['lock']:
+        _capture['file'].write(line + '\n')
+
+    return
+
+
+# Client-side rate limiting, see enable_rate_limit
+_rate_limit = { 'rate': 0.0, 'burst': 1, 'buckets': {},
+                'lock': threading.Lock() }
+
+
+def enable_rate_limit(max_rps, burst=1):
+    '''
+    Cap calls to max_rps per grid with a token bucket holding up to
+    burst tokens, shared by all worker threads
+
+    Unlike --rate, which paces the dispatcher towards a target, this
+    is a ceiling that holds whatever the thread count.
+    '''
+    _rate_limit['rate'] = max_rps
+    _rate_limit['burst'] = max(burst, 1)
+
+    return
+
+
+def acquire_token(config):
+    '''
+    Wait for a token from the grid's bucket
+
+    Tokens are reserved under the lock and the wait happens outside
+    it, so callers are served in order and never exceed the ceiling.
+
+    Returns:
+        waited (float): seconds spent waiting
+    '''
+    with _rate_limit['lock']:
+        bucket = _rate_limit['buckets'].setdefault(config['gm'], {
+            'tokens': float(_rate_limit['burst']),
+            'last': time.perf_counter(), 'waited': 0.0, 'calls': 0 })
+        now = time.perf_counter()
+        bucket['tokens'] = min(_rate_limit['burst'], bucket['tokens']
+                               + (now - bucket['last']) * _rate_limit['rate'])
+        bucket['last'] = now
+        bucket['tokens'] -= 1
+        wait = max(-bucket['tokens'] / _rate_limit['rate'], 0.0)
+        bucket['waited'] += wait
+        bucket['calls'] += 1
+    if wait:
+        time.sleep(wait)
+
+    return wait
+
+
+def report_rate_limit():
+    '''
+    Print time spent held back by the rate limiter per grid
+    '''
+    for gm, bucket in _rate_limit['buckets'].items():
+        print('Rate limit {:g} calls/s (burst {}) on {}: {} calls, '
+              '{:.1f}s waiting for tokens'
+              .format(_rate_limit['rate'], _rate_limit['burst'], gm,
+                      bucket['calls'], bucket['waited']))
+
+    return
+
+
+def thread_session(config):
+    '''
+    Return the WAPI session for the current worker thread
+    '''
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = create_session(config)
+
+    return _thread_local.session
+
+
+def make_shards(config, options, zones, shard_by='round-robin',
+                views=False):
+    '''
+    Add zone (and optionally view) shards to the workload options
+
+    Shard i uses zone shard<i>.<base_zone>. With views each shard also
+    gets network view <netview>-<i>, whose DNS view default.<netview>-<i>
+    NIOS creates along with it.
+
+    Parameters:
+        config (dict): ini configuration
+        options (dict): workload options, updated in place
+        zones (int): number of shards
+        shard_by (str): 'round-robin' or 'hash' on the object index
+        views (bool): one network and DNS view per shard
+
+    Returns:
+        options (dict)
+    '''
+    shards = []
+    for i in range(zones):
+        name = 'shard' + str(i)
+        shard_config = dict(config)
+        shard_options = dict(options)
+        shard_options['base_zone'] = name + '.' + options['base_zone']
+        view = None
+        if views:
+            shard_config['netview'] = get_netview(config) + '-' + str(i)
+            view = 'default.' + shard_config['netview']
+        shards.append({ 'name': name, 'config': shard_config,
+                        'options': shard_options, 'view': view })
+    options['shards'] = shards
+    options['shard_by'] = shard_by
+
+    return options
+
+
+def shard_for(index, options):
+    '''
+    The shard for object index, or None when not sharding
+
+    Returns:
+        shard (dict): name, config, options and DNS view
+    '''
+    shards = options.get('shards')
+    if not shards:
+        return None
+    if options['shard_by'] == 'hash':
+        digest = hashlib.blake2b(str(index).encode(), digest_size=8).digest()
+        slot = int.from_bytes(digest, 'big') % len(shards)
+    else:
+        slot = (index - 1) % len(shards)
+
+    return shards[slot]
+
+
+def setup_workload(config, op, options):
+    '''
+    Run the setup for a workload, creating shard zones and views first
+
+    With view shards the workload setup runs once per shard view.
+    '''
+    workload = WORKLOADS[op]
+    shards = options.get('shards')
+    if not shards:
+        if 'setup' in workload:
+            workload['setup'](config, options)
+        return
+
+    for shard in shards:
+        if shard['view']:
+            create_net_view(shard['config'])
+        create_zone(config, shard['options']['base_zone'], shard['view'])
+        if shard['view']:
+            if 'setup' in workload:
+                workload['setup'](shard['config'], shard['options'])
+            if 'view_setup' in workload:
+                workload['view_setup'](shard['config'], shard['options'])
+    if not shards[0]['view'] and 'setup' in workload:
+        workload['setup'](config, options)
+
+    return
+
+
+def make_job(config, op, index, options):
+    '''
+    Build a job for object index of workload op
+
+    Parameters:
+        config (dict): ini configuration
+        op (str): workload name
+        index (int): object index
+        options (dict): workload options (base_zone etc.)
+
+    Returns:
+        job (dict): op, labels, indices, method, url, data/params,
+                    codes and handler
+    '''
+    workload = WORKLOADS[op]
+    shard = shard_for(index, options)
+    if shard:
+        label, body = workload['payload'](shard['config'], index,
+                                          shard['options'])
+        if (shard['view'] and workload['method'] == 'POST'
+                and workload['object'].startswith('record:')):
+            body['view'] = shard['view']
+    else:
+        label, body = workload['payload'](config, index, options)
+    job = { 'op': op,
+            'labels': [ label ],
+            'indices': [ index ],
+            'method': workload['method'],
+            'object': workload['object'],
+            'url': wapi_url(config, workload['object']),
+            'codes': workload['codes'],
+            'handler': workload.get('handler', check_status),
+            'body': body }
+    if shard:
+        job['shard'] = shard['name']
+    if options.get('return_fields') and 'return_fields' in workload:
+        # Only when the caller needs the created object back
+        job['return_fields'] = workload['return_fields']
+        job['url'] += '?_return_fields=' + job['return_fields']
+        job['handler'] = check_created
+
+    return job
+
+
+def combine_jobs(config, jobs):
+    '''
+    Combine jobs of the same workload into a single WAPI request
+
+    WAPI executes a multi-object request as a single transaction so
+    the objects of a batch succeed or fail together.
+    '''
+    workload = WORKLOADS[jobs[0]['op']]
+    body = []
+    for job in jobs:
+        if workload['object'] == 'request':
+            body.extend(job['body'])
+        else:
+            op = { 'method': workload['method'],
+                   'object': workload['object'],
+                   'data': job['body'] }
+            if 'return_fields' in job:
+                op['args'] = { '_return_fields': job['return_fields'] }
+            body.append(op)
+
+    batch = { 'op': jobs[0]['op'],
+              'labels': [ label for job in jobs for label in job['labels'] ],
+              'indices': [ i for job in jobs for i in job['indices'] ],
+              'method': 'POST',
+              'object': 'request',
+              'url': wapi_url(config, 'request'),
+              'codes': (200, 201),
+              'handler': check_created if 'return_fields' in jobs[0] else check_status,
+              'body': body }
+    if 'shard' in jobs[0]:
+        batch['shard'] = jobs[0]['shard']
+    if 'at' in jobs[-1]:
+        # Scheduled jobs are sent when the batch fills
+        batch['at'] = jobs[-1]['at']
+
+    return batch
+
+
+def batch_jobs(config, jobs, batch=1):
+    '''
+    Group jobs into multi-object requests of up to batch objects
+
+    Jobs are buffered per workload and shard so mixed scenarios still
+    form full batches. GET workloads are never batched.
+    '''
+    buffers = {}
+    for job in jobs:
+        if batch <= 1 or job['method'] == 'GET':
+            yield job
+            continue
+        key = (job['op'], job.get('shard'))
+        buffer = buffers.setdefault(key, [])
+        buffer.append(job)
+        if len(buffer) >= batch:
+            yield combine_jobs(config, buffer)
+            buffers[key] = []
+
+    for buffer in buffers.values():
+        if buffer:
+            yield combine_jobs(config, buffer)
+
+
+def timed_wapi_call(config, job):
+    '''
+    Execute a single job on the worker thread's session
+
+    Parameters:
+        config (dict): ini configuration
+        job (dict): job as built by make_job or combine_jobs
+
+    Returns:
+        result (dict): op, labels, indices, success, text and
+                       latency in seconds
+    '''
+    started = time.perf_counter()
+    cpu_start = time.thread_time()
+    thread_profiler()
+    session = thread_session(config)
+    if job['method'] == 'GET':
+        params, data = job['body'], None
+    else:
+        params, data = None, json.dumps(job['body'])
+
+    token = 0.0
+    if _rate_limit['rate']:
+        token = acquire_token(config)
+    if _capture['file'] and not job.get('warmup'):
+        capture_request(job)
+    start = time.perf_counter()
+    error = None
+    try:
+        if _http_timing['enabled']:
+            phases = http_phases()
+            for phase in HTTP_PHASES:
+                phases[phase] = 0.0
+            response = session.request(job['method'], job['url'],
+                                       data=data, params=params, stream=True)
+            download_start = time.perf_counter()
+            response.content
+            phases['download'] = time.perf_counter() - download_start
+        else:
+            response = session.request(job['method'], job['url'],
+                                       data=data, params=params)
+    except requests.exceptions.RequestException as err:
+        # Transport failures are results too, the run carries on
+        error = err
+    latency = time.perf_counter() - start
+
+    if error is None:
+        status = response.status_code
+        success, text = job['handler'](job, response)
+    else:
+        status = None
+        success, text = False, '{}: {}'.format(type(error).__name__, error)
+    cpu = time.thread_time() - cpu_start
+    wall = time.perf_counter() - started
+    if _http_timing['enabled']:
+        socket_time = sum(http_phases().values())
+    else:
+        socket_time = 0.0
+    result = { 'op': job['op'],
+               'labels': job['labels'],
+               'indices': job['indices'],
+               'status': status,
+               'success': success,
+               'latency': latency,
+               'text': text,
+               'phases': { 'build': job.get('build', 0.0),
+                           'queue': started - job.get('submitted', started),
+                           'token': token,
+                           'cpu': cpu,
+                           'socket': socket_time,
+                           'client': max(wall - token - cpu - socket_time,
+                                         0.0) } }
+    if error is not None:
+        result['exception'] = type(error).__name__
+    if 'shard' in job:
+        result['shard'] = job['shard']
+    if 'late' in job:
+        # Behind schedule, submitted late plus waiting for a worker
+        result['late'] = job['late'] + result['phases']['queue']
+    if _http_timing['enabled']:
+        result['http'] = dict(http_phases())
+
+    return result
+
+
+def new_stats():
+    '''
+    Empty counters for a single operation
+    '''
+    return { 'calls': 0, 'objects': 0, 'success': 0, 'failed': 0,
+             'errors': {}, 'intervals': collections.Counter(),
+             'error_intervals': collections.Counter(),
+             'latency': collections.Counter(),
+             'phases': { phase: collections.Counter()
+                         for phase in PROFILE_PHASES },
+             'phase_total': collections.Counter(),
+             'http': { phase: collections.Counter() for phase in HTTP_PHASES },
+             'http_total': collections.Counter(),
+             'connections': 0 }
+
+
+def add_latency(histogram, seconds):
+    '''
+    Add a duration in seconds to a log bucketed histogram
+    '''
+    histogram[int(math.log(max(seconds, 1e-6) * 1e6, LATENCY_BASE))] += 1
+
+    return
+
+
+# Example objects kept per error class
+ERROR_SAMPLES = 3
+# Seconds per interval of the error rate timeline
+ERROR_INTERVAL = 10
+
+
+def error_class(status, text, exception=None):
+    '''
+    Classify a failed call from its HTTP status and WAPI error body,
+    or the exception type of a transport failure
+
+    WAPI errors are JSON, e.g.
+        { "Error": "AdmConDataError: None (IBDataConflictError: ...)",
+          "code": "Client.Ibap.Data.Conflict",
+          "text": "The record 'host1.apitest.poc' already exists." }
+    and are classed by status and code, or the Error prefix when
+    there is no code.
+
+    Returns:
+        key (str): e.g. '400 Client.Ibap.Data.Conflict' or
+                   'ConnectionError'
+        message (str): the error text
+    '''
+    if exception:
+        return exception, text
+    try:
+        error = json.loads(text)
+    except ValueError:
+        error = None
+    if isinstance(error, dict):
+        code = error.get('code')
+        prefix = str(error.get('Error', '')).split(':', 1)[0].strip()
+        message = str(error.get('text') or error.get('Error', ''))
+    else:
+        code, prefix, message = None, None, text
+
+    return '{} {}'.format(status, code or prefix or 'HTTP error'), message
+
+
+def op_totals(stats, op):
+    '''
+    Counts and latency of an operation summed over its per shard or
+    per target keys (op@name)
+
+    Parameters:
+        stats (dict): per operation statistics
+        op (str): operation
+
+    Returns:
+        totals (dict): calls, objects, success, failed and latency
+    '''
+    totals = new_stats()
+    for key, op_stats in stats.items():
+        if key == op or key.startswith(op + '@'):
+            for count in ('calls', 'objects', 'success', 'failed'):
+                totals[count] += op_stats[count]
+            totals['latency'].update(op_stats['latency'])
+
+    return totals
+
+
+def record_result(stats, result):
+    '''
+    Add a completed call to the per operation statistics
+
+    Sharded calls are counted per operation and shard (op@shard).
+    '''
+    key = result['op']
+    if 'shard' in result:
+        key += '@' + result['shard']
+    op_stats = stats.setdefault(key, new_stats())
+    count = len(result['indices'])
+    interval = int(time.time() // ERROR_INTERVAL)
+    op_stats['calls'] += 1
+    op_stats['objects'] += count
+    op_stats['intervals'][interval] += count
+    if result['success']:
+        op_stats['success'] += count
+    else:
+        op_stats['failed'] += count
+        op_stats['error_intervals'][interval] += count
+        key, message = error_class(result.get('status'), result['text'],
+                                   result.get('exception'))
+        error = op_stats['errors'].setdefault(key, { 'count': 0,
+                                                     'samples': [],
+                                                     'message': message[:200] })
+        error['count'] += count
+        room = ERROR_SAMPLES - len(error['samples'])
+        if room > 0:
+            error['samples'].extend(result['labels'][:room])
+    add_latency(op_stats['latency'], result['latency'])
+    for phase, seconds in result['phases'].items():
+        add_latency(op_stats['phases'][phase], seconds)
+        op_stats['phase_total'][phase] += seconds
+    if 'http' in result:
+        for phase, seconds in result['http'].items():
+            add_latency(op_stats['http'][phase], seconds)
+            op_stats['http_total'][phase] += seconds
+        if result['http']['connect']:
+            op_stats['connections'] += 1
+
+    return
+
+
+def percentile(histogram, pct):
+    '''
+    Approximate percentile latency in seconds from a histogram
+    '''
+    total = sum(histogram.values())
+    running = 0
+    for bucket in sorted(histogram):
+        running += histogram[bucket]
+        if running >= total * pct / 100:
+            return LATENCY_BASE ** (bucket + 1) / 1e6
+
+    return 0.0
+
+
+def dispatch(config, executor, jobs, max_pending, rate, complete):
+    '''
+    Submit jobs to the executor keeping at most max_pending in flight
+
+    Parameters:
+        config (dict): ini configuration
+        executor (ThreadPoolExecutor): worker pool
+        jobs (iter): iterable of job dicts
+        max_pending (int): maximum number of outstanding jobs
+        rate (float): target calls per second, 0 for unpaced
+        complete (func): called with each result dict on completion
+
+    Jobs with an 'at' offset in seconds are submitted at that time
+    after the start rather than paced by rate.
+
+    Returns:
+        sent (int): number of jobs submitted
+    '''
+    pending = set()
+    sent = 0
+    jobs = iter(jobs)
+    clock = time.perf_counter()
+
+    try:
+        while True:
+            # CPU spent generating the job's payload
+            build_start = time.thread_time()
+            job = next(jobs, None)
+            if job is None:
+                break
+            job['build'] = time.thread_time() - build_start
+            if 'at' in job:
+                delay = clock + job['at'] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                job['late'] = max(-delay, 0.0)
+            elif rate:
+                delay = clock + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            job['submitted'] = time.perf_counter()
+            pending.add(executor.submit(timed_wapi_call, config, job))
+            sent += 1
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    complete(future.result())
+    except KeyboardInterrupt:
+        # Stop cleanly, results of in-flight calls are still recorded
+        print()
+        print('Interrupted, waiting for {} in-flight calls'.format(len(pending)))
+    done, pending = concurrent.futures.wait(pending)
+    for future in done:
+        complete(future.result())
+
+    return sent
+
+
+def parse_warmup(warmup):
+    '''
+    Parse a warm-up specification
+
+    Parameters:
+        warmup (str): number of calls (e.g. '200') or a time with an
+                      s, m or h suffix as for parse_duration ('30s')
+
+    Returns:
+        count (int): number of warm-up calls, 0 if time based
+        seconds (float): warm-up duration, 0 if count based
+
+    Raises:
+        ValueError: warmup is neither
+    '''
+    warmup = str(warmup).strip().lower()
+    try:
+        if warmup[-1:] in ('s', 'm', 'h'):
+            return 0, parse_duration(warmup)
+        else:
+            return int(warmup), 0.0
+    except ValueError:
+        raise ValueError('Invalid warm-up {!r}, expected calls (e.g. 200) '
+                         'or a time (e.g. 30s, 2m)'.format(warmup))
+
+
+def warmup_arg(warmup):
+    '''
+    argparse type for --warmup, rejects what parse_warmup cannot parse
+    '''
+    try:
+        parse_warmup(warmup)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+    return warmup
+
+
+def warmup_jobs(config, warmup, options):
+    '''
+    Generate paged host reads for the warm-up phase
+
+    Reads open every worker's connection, complete the TLS handshake
+    and authentication, and prime the GM without creating objects.
+    '''
+    count, seconds = parse_warmup(warmup)
+    deadline = time.perf_counter() + seconds
+    index = 0
+    while ( (count and index < count)
+            or (seconds and time.perf_counter() < deadline) ):
+        index += 1
+        job = make_job(config, 'read', index, options)
+        job['warmup'] = True
+        yield job
+
+
+def run_engine(config, jobs, threads=5, rate=0, total=None, callback=None,
+               warmup=None, quiet=False):
+    '''
+    Run jobs concurrently across a pool of worker threads
+
+    Jobs are consumed lazily so that the generator can react to
+    completed results passed to callback. Optional warm-up jobs run
+    first on the same workers and sessions and are excluded from
+    the statistics and run time. The first threads warm-up calls are
+    held at a barrier so that every worker is started and has its
+    connection open before measuring, at least threads calls are made.
+
+    Parameters:
+        config (dict): ini configuration
+        jobs (iter): iterable of job dicts
+        threads (int): number of worker threads (and sessions)
+        rate (float): target calls per second, 0 for unpaced
+        total (int): expected number of objects for the progress bar
+        callback (func): called with each result dict on completion
+        warmup (iter): iterable of warm-up job dicts
+        quiet (bool): no progress bar or timing output
+
+    Returns:
+        stats (dict): per operation statistics
+        run_time (timedelta): measured duration
+    '''
+    stats = {}
+    max_pending = threads * 2
+
+    def complete(result):
+        record_result(stats, result)
+        if _timeline['interval']:
+            timeline_record(result)
+        if callback:
+            callback(result)
+        pbar.update(len(result['indices']))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        if warmup:
+            warm_stats = {}
+            warm_start = time.perf_counter()
+            warmup = iter(warmup)
+            opening = list(itertools.islice(warmup, threads))
+            sent = 0
+            if opening:
+                barrier = threading.Barrier(threads)
+
+                def open_worker(job):
+                    # Busy workers are never reused, so each of these
+                    # calls starts its own worker thread
+                    try:
+                        barrier.wait(timeout=60)
+                    except threading.BrokenBarrierError:
+                        logging.warning('Not all workers started for warm-up')
+                    return timed_wapi_call(config, job)
+
+                futures = [ executor.submit(open_worker,
+                                            dict(opening[i % len(opening)]))
+                            for i in range(threads) ]
+                for future in futures:
+                    record_result(warm_stats, future.result())
+                sent = threads
+            sent += dispatch(config, executor, warmup, max_pending, 0,
+                             lambda result: record_result(warm_stats, result))
+            failed = sum(s['failed'] for s in warm_stats.values())
+            if not quiet:
+                print('Warm-up: {} calls ({} failed) in {:.1f}s, not measured'
+                      .format(sent, failed, time.perf_counter() - warm_start))
+
+        thread_profiler()
+        start = datetime.datetime.now()
+        if _timeline['start'] is None:
+            _timeline['start'] = time.perf_counter()
+        process_start = time.process_time()
+        with tqdm.tqdm(total=total, disable=quiet) as pbar:
+            dispatch(config, executor, jobs, max_pending, rate, complete)
+        end = datetime.datetime.now()
+        if _profiling['enabled']:
+            _profiling['process_cpu'] += time.process_time() - process_start
+            _profiling['wall'] += (end - start).total_seconds()
+
+    if not quiet:
+        print()
+        print("Start Time: {}".format(start))
+        print("End Time: {}".format(end))
+
+    return stats, end - start
+
+
+def report_stats(stats, run_time):
+    '''
+    Print per operation throughput and latency, then failures
+    '''
+    seconds = run_time.total_seconds() or 1
+    print()
+    print('{:<14}{:>9}{:>9}{:>9}{:>9}{:>10}{:>10}{:>10}{:>10}'
+          .format('Operation', 'Calls', 'Objects', 'OK', 'Failed',
+                  'Objects/s', 'p50 ms', 'p90 ms', 'p99 ms'))
+    for op, op_stats in sorted(stats.items()):
+        print('{:<14}{:>9}{:>9}{:>9}{:>9}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}'
+              .format(op, op_stats['calls'], op_stats['objects'],
+                      op_stats['success'], op_stats['failed'],
+                      op_stats['objects'] / seconds,
+                      percentile(op_stats['latency'], 50) * 1000,
+                      percentile(op_stats['latency'], 90) * 1000,
+                      percentile(op_stats['latency'], 99) * 1000))
+
+    if any(op_stats['failed'] for op_stats in stats.values()):
+        report_errors(stats)
+    if _profiling['enabled']:
+        report_phases(stats)
+    if _http_timing['enabled']:
+        report_http_phases(stats)
+
+    return
+
+
+def report_errors(stats, max_rows=30):
+    '''
+    Print failures by operation and error class with example objects,
+    and the error rate over time
+    '''
+    print()
+    print('{:<14}{:<40}{:>9}  {}'.format('Operation', 'Error', 'Objects',
+                                         'Examples'))
+    for op, op_stats in sorted(stats.items()):
+        errors = sorted(op_stats['errors'].items(),
+                        key=lambda item: -item[1]['count'])
+        for key, error in errors:
+            print('{:<14}{:<40}{:>9}  {}'.format(op, key, error['count'],
+                                                 ', '.join(error['samples'])))
+            print('{:<14}{}'.format('', error['message']))
+
+    intervals = collections.Counter()
+    failures = collections.Counter()
+    for op_stats in stats.values():
+        intervals.update(op_stats['intervals'])
+        failures.update(op_stats['error_intervals'])
+    first, last = min(intervals), max(intervals)
+    # Merge intervals so long runs fit in max_rows
+    step = max(1, math.ceil((last - first + 1) / max_rows))
+    print()
+    print('Error rate over time ({}s intervals)'.format(step * ERROR_INTERVAL))
+    print('{:>9}{:>9}{:>9}{:>8}'.format('Seconds', 'Objects', 'Failed', '%'))
+    for start in range(first, last + 1, step):
+        objects = sum(intervals[i] for i in range(start, start + step))
+        failed = sum(failures[i] for i in range(start, start + step))
+        if objects:
+            print('{:>9}{:>9}{:>9}{:>8.1f}'.format(
+                (start - first) * ERROR_INTERVAL, objects, failed,
+                100 * failed / objects))
+
+    return
+
+
+def report_http_phases(stats):
+    '''
+    Print the per phase HTTP timing histograms
+    '''
+    print()
+    print('HTTP phases per call (ms)')
+    print('{:<14}{:<10}{:>10}{:>10}{:>10}{:>10}{:>10}'
+          .format('Operation', 'Phase', 'Mean', 'p50', 'p90', 'p99', 'Max'))
+    for op, op_stats in stats.items():
+        for phase in HTTP_PHASES:
+            histogram = op_stats['http'][phase]
+            print('{:<14}{:<10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'
+                  .format(op, phase,
+                          op_stats['http_total'][phase]
+                          / op_stats['calls'] * 1000,
+                          percentile(histogram, 50) * 1000,
+                          percentile(histogram, 90) * 1000,
+                          percentile(histogram, 99) * 1000,
+                          percentile(histogram, 100) * 1000))
+        print('{:<14}{} new connections for {} calls'
+              .format(op, op_stats['connections'], op_stats['calls']))
+
+    return
+
+
+def report_phases(stats):
+    '''
+    Print where each request's time went on the client
+    '''
+    print()
+    print('Client time per call (ms)')
+    print('{:<14}{:<8}{:>10}{:>10}{:>10}{:>10}'
+          .format('Operation', 'Phase', 'Mean', 'p50', 'p99', '% wall'))
+    for op, op_stats in stats.items():
+        wall = sum(op_stats['phase_total'].values()) or 1
+        for phase in PROFILE_PHASES:
+            print('{:<14}{:<8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.1f}'
+                  .format(op, phase,
+                          op_stats['phase_total'][phase]
+                          / op_stats['calls'] * 1000,
+                          percentile(op_stats['phases'][phase], 50) * 1000,
+                          percentile(op_stats['phases'][phase], 99) * 1000,
+                          op_stats['phase_total'][phase] / wall * 100))
+
+    return
+
+
+# Per interval engine results, see enable_timeline
+_timeline = { 'interval': 0, 'start': None, 'buckets': {},
+              'lock': threading.Lock() }
+
+
+def enable_timeline(interval):
+    '''
+    Record calls, objects, failures and latency per interval of
+    seconds from the start of the (first) measured run
+    '''
+    _timeline['interval'] = interval
+    _timeline['start'] = None
+    _timeline['buckets'] = {}
+
+    return
+
+
+def timeline_record(result):
+    '''
+    Add a completed call to its interval of the timeline
+    '''
+    offset = time.perf_counter() - _timeline['start']
+    with _timeline['lock']:
+        entry = _timeline['buckets'].setdefault(
+            int(offset // _timeline['interval']),
+            { 'calls': 0, 'objects': 0, 'failed': 0,
+              'latency': collections.Counter() })
+        entry['calls'] += 1
+        entry['objects'] += len(result['indices'])
+        if not result['success']:
+            entry['failed'] += len(result['indices'])
+        add_latency(entry['latency'], result['latency'])
+
+    return
+
+
+def sample_health(session, config):
+    '''
+    Take one sample of GM health over WAPI
+
+    Parameters:
+        session (requests.Session): the sampler's own session
+        config (dict): ini configuration
+
+    Returns:
+        sample (dict): time, wapi_ms (GM responsiveness), members,
+                       degraded ['member: service status'], objects
+                       and percent_used (highest member)
+    '''
+    sample = { 'time': time.perf_counter(), 'wapi_ms': None,
+               'members': None, 'degraded': [], 'objects': None,
+               'percent_used': None }
+    start = time.perf_counter()
+    try:
+        response = session.get(wapi_url(config, 'member'),
+                               params={ '_return_fields': 'host_name,node_info' })
+        sample['wapi_ms'] = (time.perf_counter() - start) * 1000
+        if response.status_code == 200:
+            members = response.json()
+            if not isinstance(members, list):
+                raise ValueError('unexpected member response {!r:.80}'
+                                 .format(members))
+            members = [ m for m in members if isinstance(m, dict) ]
+            sample['members'] = len(members)
+            for member in members:
+                for node in member.get('node_info') or []:
+                    for service in node.get('service_status') or []:
+                        if service.get('status') not in ('WORKING', 'INACTIVE', None):
+                            sample['degraded'].append('{}: {} {}'.format(
+                                member.get('host_name'), service.get('service'),
+                                service.get('status')))
+
+        response = session.get(wapi_url(config, 'capacityreport'),
+                               params={ '_return_fields': 'name,total_objects,percent_used' })
+        if response.status_code == 200:
+            reports = response.json()
+            if not isinstance(reports, list):
+                raise ValueError('unexpected capacityreport response {!r:.80}'
+                                 .format(reports))
+            reports = [ r for r in reports if isinstance(r, dict) ]
+            if reports:
+                sample['objects'] = max(r.get('total_objects', 0) for r in reports)
+                sample['percent_used'] = max(r.get('percent_used', 0) for r in reports)
+    except (requests.exceptions.RequestException, ValueError) as err:
+        logging.warning('Health sample failed: {}'.format(err))
+
+    return sample
+
+
+def start_health_sampler(config, interval):
+    '''
+    Sample GM health every interval seconds on a separate session
+    until the returned event is set
+
+    Returns:
+        stop (threading.Event): set to stop sampling
+        thread (threading.Thread): sampler thread
+        samples (list): samples, appended as they are taken
+    '''
+    stop = threading.Event()
+    samples = []
+
+    def sampler():
+        session = create_session(config)
+        while True:
+            try:
+                samples.append(sample_health(session, config))
+            except Exception as err:
+                # Keep sampling for the rest of the run
+                logging.warning('Health sample failed: {!r}'.format(err))
+            if stop.wait(interval):
+                break
+
+    thread = threading.Thread(target=sampler, daemon=True)
+    thread.start()
+
+    return stop, thread, samples
+
+
+def report_timeline(samples, health_out=None):
+    '''
+    Print, and optionally write as CSV, the engine timeline alongside
+    the GM health samples on the same intervals
+    '''
+    interval = _timeline['interval']
+    start = _timeline['start'] or time.perf_counter()
+    health = {}
+    for sample in samples:
+        # Latest sample in each interval, setup time before the run is -1
+        health[max(int((sample['time'] - start) // interval), -1)] = sample
+    slots = sorted(set(_timeline['buckets']) | set(health))
+    header = [ 'seconds', 'calls/s', 'objects/s', 'failed', 'p50 ms',
+               'p99 ms', 'gm objects', 'percent used', 'wapi ms',
+               'members', 'degraded' ]
+    rows = []
+    for slot in slots:
+        entry = _timeline['buckets'].get(slot)
+        sample = health.get(slot, {})
+        row = [ 'pre' if slot < 0 else slot * interval ]
+        if entry:
+            row += [ round(entry['calls'] / interval, 1),
+                     round(entry['objects'] / interval, 1),
+                     entry['failed'],
+                     round(percentile(entry['latency'], 50) * 1000, 1),
+                     round(percentile(entry['latency'], 99) * 1000, 1) ]
+        else:
+            row += [ '', '', '', '', '' ]
+        wapi_ms = sample.get('wapi_ms')
+        row += [ '' if sample.get('objects') is None else sample['objects'],
+                 '' if sample.get('percent_used') is None else sample['percent_used'],
+                 '' if wapi_ms is None else round(wapi_ms, 1),
+                 '' if sample.get('members') is None else sample['members'],
+                 '; '.join(sample.get('degraded', [])) ]
+        rows.append(row)
+
+    print()
+    print('{:>8}{:>9}{:>10}{:>7}{:>8}{:>8}{:>11}{:>6}{:>8}  {}'
+          .format('Seconds', 'Calls/s', 'Objects/s', 'Failed', 'p50 ms',
+                  'p99 ms', 'GM objects', 'Used', 'WAPI ms', 'Degraded'))
+    for row in rows:
+        print('{:>8}{:>9}{:>10}{:>7}{:>8}{:>8}{:>11}{:>6}{:>8}  {}'
+              .format(*row[:9], row[10]))
+
+    if health_out:
+        with open(health_out, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print('Timeline written to {}'.format(health_out))
+
+    return
+
+
+def parse_duration(duration):
+    '''
+    Parse a run duration
+
+    Parameters:
+        duration (str): seconds, optionally suffixed s, m or h
+
+    Returns:
+        seconds (float): duration in seconds
+    '''
+    units = { 's': 1, 'm': 60, 'h': 3600 }
+    duration = str(duration).strip().lower()
+    if duration[-1:] in units:
+        return float(duration[:-1]) * units[duration[-1]]
+    else:
+        return float(duration)
+
+
+def object_indices(n=1, duration=None, start=1):
+    '''
+    Object indices start..start+n-1, or unbounded until duration
+    has elapsed
+
+    The deadline is set when the first index is requested so that
+    any warm-up phase is not counted against the duration.
+    '''
+    if duration:
+        deadline = time.perf_counter() + parse_duration(duration)
+        for index in itertools.count(start):
+            if time.perf_counter() >= deadline:
+                return
+            yield index
+    else:
+        yield from range(start, start + n)
+
+
+def workload_jobs(config, op, indices, options):
+    '''
+    Generate jobs for the given object indices of a single workload
+
+    Objects are built lazily, the run stops cleanly if the workload
+    runs out of address space.
+    '''
+    for index in indices:
+        try:
+            job = make_job(config, op, index, options)
+        except IndexError as err:
+            logging.warning('Stopping {} workload: {}'.format(op, err))
+            print('Address space exhausted at {} object {}'
+                  .format(op, index))
+            return
+        yield job
+
+
+# Seconds between checkpoint writes
+CHECKPOINT_INTERVAL = 10
+
+
+def add_completed(ranges, index):
+    '''
+    Add an index to a sorted list of [start, end] completed ranges
+    '''
+    pos = bisect.bisect_right(ranges, [index, math.inf])
+    if pos and ranges[pos - 1][1] >= index:
+        return
+    merge_left = pos > 0 and ranges[pos - 1][1] == index - 1
+    merge_right = pos < len(ranges) and ranges[pos][0] == index + 1
+    if merge_left and merge_right:
+        ranges[pos - 1][1] = ranges[pos][1]
+        del ranges[pos]
+    elif merge_left:
+        ranges[pos - 1][1] = index
+    elif merge_right:
+        ranges[pos][0] = index
+    else:
+        ranges.insert(pos, [ index, index ])
+
+    return
+
+
+def is_completed(ranges, index):
+    '''
+    True if index lies in one of the completed ranges
+    '''
+    pos = bisect.bisect_right(ranges, [index, math.inf])
+    return pos > 0 and ranges[pos - 1][1] >= index
+
+
+def count_completed(ranges, first, last):
+    '''
+    Number of completed indices between first and last inclusive
+    '''
+    return sum(max(0, min(end, last) - max(start, first) + 1)
+               for start, end in ranges)
+
+
+def checkpoint_layout(options):
+    '''
+    Sharding that decides where each object index goes, stored in
+    checkpoints so a resume places the remaining objects alike
+    '''
+    shards = options.get('shards', [])
+
+    return { 'zones': len(shards),
+             'shard_by': options.get('shard_by') if shards else None,
+             'shard_views': any(shard['view'] for shard in shards) }
+
+
+def read_checkpoint(checkpoint_file, op, options):
+    '''
+    Load completed index ranges from a checkpoint file
+
+    Parameters:
+        checkpoint_file (str): checkpoint file name
+        op (str): workload name the run is for
+        options (dict): workload options, base_zone and the sharding
+                        (see checkpoint_layout) must match
+
+    Returns:
+        ranges (list): sorted [start, end] completed ranges
+    '''
+    try:
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as err:
+        logging.warning('No usable checkpoint {}: {}'.format(checkpoint_file, err))
+        return []
+
+    if ( checkpoint.get('op') != op
+         or checkpoint.get('base_zone') != options['base_zone'] ):
+        print('Checkpoint {} is for {} in {}, not resuming'
+              .format(checkpoint_file, checkpoint.get('op'),
+                      checkpoint.get('base_zone')))
+        return []
+    layout = checkpoint_layout(options)
+    saved = { key: checkpoint.get(key, default) for key, default
+              in (('zones', 0), ('shard_by', None), ('shard_views', False)) }
+    if saved != layout:
+        if saved['zones']:
+            sharding = '--zones {} --shard-by {}{}'.format(
+                saved['zones'], saved['shard_by'],
+                ' --shard-views' if saved['shard_views'] else '')
+        else:
+            sharding = 'an unsharded run'
+        print('Checkpoint {} is for {}, not resuming'
+              .format(checkpoint_file, sharding))
+        return []
+
+    return [ list(r) for r in checkpoint.get('completed', []) ]
+
+
+def write_checkpoint(checkpoint_file, op, options, ranges):
+    '''
+    Atomically write completed index ranges to a checkpoint file
+    '''
+    checkpoint = dict(checkpoint_layout(options),
+                      op=op, base_zone=options['base_zone'],
+                      updated=str(datetime.datetime.now()),
+                      completed=ranges)
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+    return
+
+
+def checkpoint_callback(checkpoint_file, op, options, completed):
+    '''
+    Engine callback adding successful indices to completed and
+    writing the checkpoint every CHECKPOINT_INTERVAL seconds
+    '''
+    last_write = [ time.perf_counter() ]
+
+    def callback(result):
+        if result['success']:
+            for index in result['indices']:
+                add_completed(completed, index)
+        if time.perf_counter() - last_write[0] >= CHECKPOINT_INTERVAL:
+            write_checkpoint(checkpoint_file, op, options, completed)
+            last_write[0] = time.perf_counter()
+
+    return callback
+
+
+def run_workload(config, op, n, options, threads=5, rate=0, batch=1,
+                 warmup=None, duration=None, start=1, setup=True,
+                 checkpoint=None, resume=False, quiet=False):
+    '''
+    Run n objects, or as many as fit in duration, of a single
+    registered workload on the engine
+
+    Parameters:
+        config (dict): ini configuration
+        op (str): workload name from WORKLOADS
+        n (int): number of objects
+        options (dict): workload options (base_zone etc.)
+        threads (int): number of worker threads
+        rate (float): target calls per second, 0 for unpaced
+        batch (int): objects per WAPI request
+        warmup (str): warm-up calls or seconds excluded from results
+        duration (str): run for this long instead of n objects
+        start (int): first object index
+        setup (bool): run the workload's setup function first
+        checkpoint (str): file to record completed indices in
+        resume (bool): skip indices completed in the checkpoint
+        quiet (bool): no progress, timing or report output
+
+    Returns:
+        run_time (timedelta): measured duration
+        stats (dict): per operation statistics
+    '''
+    if setup:
+        setup_workload(config, op, options)
+
+    indices = object_indices(n, duration, start)
+    total = None if duration else n
+    completed = []
+    if checkpoint and resume:
+        completed = read_checkpoint(checkpoint, op, options)
+        done = [ list(r) for r in completed ]
+        indices = ( i for i in indices if not is_completed(done, i) )
+        if total:
+            total -= count_completed(done, start, start + n - 1)
+        print('Resuming {}: {} objects already completed'
+              .format(op, count_completed(done, 1, math.inf)))
+    callback = ( checkpoint_callback(checkpoint, op, options, completed)
+                 if checkpoint else None )
+
+    jobs = batch_jobs(config, workload_jobs(config, op, indices, options),
+                      batch)
+    if warmup:
+        warmup = warmup_jobs(config, warmup, options)
+    try:
+        stats, run_time = run_engine(config, jobs, threads=threads,
+                                     rate=rate, total=total,
+                                     callback=callback, warmup=warmup,
+                                     quiet=quiet)
+    finally:
+        if checkpoint:
+            write_checkpoint(checkpoint, op, options, completed)
+            print('Checkpoint written to {}'.format(checkpoint))
+    if not quiet:
+        report_stats(stats, run_time)
+
+    return run_time, stats
+
+
+# Objects per page for verification reads
+VERIFY_PAGE_SIZE = 1000
+# Example objects reported per verification problem
+VERIFY_SAMPLES = 5
+
+
+def page_objects(session, config, wapi_object, params, fields):
+    '''
+    Generate all objects matching params, a page at a time
+
+    Parameters:
+        session (requests.Session): WAPI session
+        config (dict): ini configuration
+        wapi_object (str): WAPI object type
+        params (dict): search parameters
+        fields (str): _return_fields, kept minimal for speed
+
+    Returns:
+        objects (generator): object dicts
+    '''
+    url = wapi_url(config, wapi_object)
+    params = dict(params, _return_fields=fields, _paging=1,
+                  _max_results=VERIFY_PAGE_SIZE, _return_as_object=1)
+    while True:
+        response = session.get(url, params=params)
+        if response.status_code != 200:
+            logging.warning('Verification read of {} failed: {}'
+                            .format(wapi_object, response.text))
+            return
+        page = response.json()
+        yield from page.get('result', [])
+        if not page.get('next_page_id'):
+            return
+        params = { '_page_id': page['next_page_id'] }
+
+
+def verify_workload(config, op, indices, options):
+    '''
+    Check that the objects of a workload exist with the expected
+    addresses using paged bulk reads
+
+    All objects in the workload's zones (or network view) are read
+    once into a name to addresses index which is then compared with
+    the expected objects.
+
+    Parameters:
+        config (dict): ini configuration
+        op (str): workload name from WORKLOADS
+        indices (iter): object indices expected to exist
+        options (dict): workload options (base_zone etc.)
+
+    Returns:
+        problems (dict): counts of expected, found, missing, wrong_ip,
+                         extra and duplicate_ip
+    '''
+    workload = WORKLOADS[op]
+    spec = workload.get('verify')
+    if not spec:
+        print('Object type {} has no verification support.'.format(op))
+        return {}
+
+    start = time.perf_counter()
+    session = create_session(config)
+    contexts = [ (shard['config'], shard['options'], shard['view'])
+                 for shard in options.get('shards') or [] ]
+    if not contexts:
+        contexts = [ (config, options, None) ]
+    scopes = []
+    for context in contexts:
+        scope = spec['scope'](*context)
+        if scope not in scopes:
+            scopes.append(scope)
+
+    found = {}
+    ip_count = collections.Counter()
+    read = 0
+    for scope in scopes:
+        for obj in page_objects(session, config, workload['object'], scope,
+                                spec['fields']):
+            read += 1
+            ips = spec['ips'](obj)
+            found.setdefault(spec['key'](obj).lower(), []).extend(ips)
+            ip_count.update(ips)
+    read_time = time.perf_counter() - start
+
+    problems = { 'expected': 0, 'found': read, 'missing': [], 'wrong_ip': [],
+                 'extra': 0, 'duplicate_ip': [] }
+    expected = set()
+    for index in indices:
+        shard = shard_for(index, options)
+        try:
+            if shard:
+                label, body = workload['payload'](shard['config'], index,
+                                                  shard['options'])
+            else:
+                label, body = workload['payload'](config, index, options)
+        except IndexError:
+            break
+        key = label.lower()
+        expected.add(key)
+        problems['expected'] += 1
+        if key not in found:
+            problems['missing'].append(label)
+        elif spec['expected_ip'] and spec['expected_ip'](body) not in found[key]:
+            problems['wrong_ip'].append(label)
+    problems['extra'] = len(found.keys() - expected)
+    problems['duplicate_ip'] = [ ip for ip, count in ip_count.items()
+                                 if count > 1 ]
+
+    print()
+    print('Verified {} expected {} objects against {} read in {:.1f}s ({:.0f} objects/s)'
+          .format(problems['expected'], op, read, read_time,
+                  read / (read_time or 1)))
+    for problem, title in (('missing', 'Missing'), ('wrong_ip', 'Wrong IP'),
+                           ('duplicate_ip', 'Duplicate IP')):
+        examples = problems[problem]
+        print('{:<14}{:>9}  {}'.format(title, len(examples),
+                                       ', '.join(examples[:VERIFY_SAMPLES])))
+        problems[problem] = len(examples)
+    print('{:<14}{:>9}  (in scope, not created by this run)'
+          .format('Extra', problems['extra']))
+
+    return problems
+
+
+def run_targets(targets, op, n, threads=5, rate=0, batch=1, warmup=None,
+                duration=None):
+    '''
+    Run the same workload against several targets concurrently
+
+    Each target runs on its own engine, worker threads and sessions
+    so all targets see identical client conditions.
+
+    Parameters:
+        targets (list): (name, config, options) per target
+        op (str): workload name from WORKLOADS
+        n (int): number of objects per target
+        threads (int): worker threads per target
+        rate (float): target calls per second per target
+        batch (int): objects per WAPI request
+        warmup (str): warm-up calls or seconds
+        duration (str): run for this long instead of n objects
+
+    Returns:
+        run_time (timedelta): longest target run time
+        stats (dict): statistics keyed op@target
+    '''
+    print('Running {} against {}'
+          .format(op, ', '.join(name for name, config, options in targets)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = [ executor.submit(run_workload, config, op, n, options,
+                                    threads=threads, rate=rate,
+                                    batch=batch, warmup=warmup,
+                                    duration=duration, quiet=True)
+                    for name, config, options in targets ]
+        results = [ (name,) + future.result()
+                    for (name, config, options), future
+                    in zip(targets, futures) ]
+
+    report_targets(results)
+    stats = {}
+    for name, run_time, target_stats in results:
+        for key, op_stats in target_stats.items():
+            stats[key + '@' + name] = op_stats
+
+    return max(run_time for name, run_time, target_stats in results), stats
+
+
+def report_targets(results):
+    '''
+    Print a side by side comparison of per target results
+
+    Parameters:
+        results (list): (name, run_time, stats) per target
+    '''
+    names = [ name for name, run_time, stats in results ]
+    width = max(12, max(len(name) for name in names) + 2)
+    keys = sorted({ key for name, run_time, stats in results
+                    for key in stats })
+    rows = [ ('Calls', lambda s, secs: s['calls']),
+             ('Objects', lambda s, secs: s['objects']),
+             ('OK', lambda s, secs: s['success']),
+             ('Failed', lambda s, secs: s['failed']),
+             ('Objects/s', lambda s, secs: round(s['objects'] / secs, 1)),
+             ('p50 ms', lambda s, secs: round(percentile(s['latency'], 50) * 1000, 1)),
+             ('p90 ms', lambda s, secs: round(percentile(s['latency'], 90) * 1000, 1)),
+             ('p99 ms', lambda s, secs: round(percentile(s['latency'], 99) * 1000, 1)) ]
+
+    for key in keys:
+        print()
+        print('{:<14}'.format(key)
+              + ''.join('{:>{}}'.format(name, width) for name in names))
+        for label, value in rows:
+            line = '{:<14}'.format(label)
+            for name, run_time, stats in results:
+                if key in stats:
+                    line += '{:>{}}'.format(value(stats[key],
+                                                  run_time.total_seconds() or 1),
+                                            width)
+                else:
+                    line += '{:>{}}'.format('-', width)
+            print(line)
+    print('{:<14}'.format('Run time')
+          + ''.join('{:>{}.1f}'.format(run_time.total_seconds(), width)
+                    for name, run_time, stats in results))
+
+    return
+
+
+def replay_jobs(config, replay_file, speed=1.0):
+    '''
+    Generate jobs from a capture log, scheduled at the captured
+    offsets divided by speed (0 for as fast as possible)
+
+    The log is read lazily so captures of any size can be replayed.
+    '''
+    first = None
+    with open(replay_file) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                logging.warning('Skipping line {} of {}: {}'
+                                .format(line_number, replay_file, err))
+                continue
+            if first is None:
+                first = record['time']
+            if record['method'] == 'GET':
+                codes = (200,)
+            else:
+                codes = (200, 201)
+            url = wapi_url(config, record['object'])
+            if record.get('args'):
+                url += '?' + urllib.parse.urlencode(record['args'])
+            job = { 'op': record.get('op', record['object']),
+                    'labels': [ record['object'] ],
+                    'indices': [ line_number ],
+                    'method': record['method'],
+                    'object': record['object'],
+                    'url': url,
+                    'codes': codes,
+                    'handler': check_status,
+                    'body': record['body'] }
+            if speed:
+                job['at'] = (record['time'] - first) / speed
+            yield job
+
+
+def run_replay(config, replay_file, threads=5, speed=1.0):
+    '''
+    Replay a capture log against the grid
+
+    Calls are sent at the original timing scaled by speed. With too
+    few threads for the captured concurrency, or a slower grid, calls
+    fall behind schedule, which is reported.
+
+    Parameters:
+        config (dict): ini configuration
+        replay_file (str): JSONL log written by --capture
+        threads (int): number of worker threads
+        speed (float): speed factor, 0 for as fast as possible
+
+    Returns:
+        run_time (timedelta): measured duration
+        stats (dict): per operation statistics
+    '''
+    lag = { 'calls': 0, 'late': 0, 'max': 0.0 }
+
+    def callback(result):
+        if 'late' in result:
+            lag['calls'] += 1
+            if result['late'] > 0.01:
+                lag['late'] += 1
+            lag['max'] = max(lag['max'], result['late'])
+
+    jobs = replay_jobs(config, replay_file, speed)
+    stats, run_time = run_engine(config, jobs, threads=threads,
+                                 callback=callback)
+    report_stats(stats, run_time)
+    if lag['calls']:
+        print('{} of {} calls sent over 10ms behind schedule (max {:.1f}ms)'
+              .format(lag['late'], lag['calls'], lag['max'] * 1000))
+
+    return run_time, stats
+
+
+def write_csv(config, op, indices, options, csv_file):
+    '''
+    Stream the objects of a workload to a NIOS CSV import file
+
+    Parameters:
+        config (dict): ini configuration
+        op (str): workload name from WORKLOADS
+        indices (iter): object indices
+        options (dict): workload options (base_zone etc.)
+        csv_file (str): name of file to write
+
+    Returns:
+        count (int): number of objects written
+    '''
+    header, row = WORKLOADS[op]['csv']
+    count = 0
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for index in indices:
+            shard = shard_for(index, options)
+            try:
+                if shard:
+                    writer.writerow(row(shard['config'], index,
+                                        shard['options']))
+                else:
+                    writer.writerow(row(config, index, options))
+            except IndexError as err:
+                logging.warning('Stopping CSV generation: {}'.format(err))
+                break
+            count += 1
+
+    return count
+
+
+def run_csv_comparison(config, op, n, options, csv_file=None,
+                       threads=5, rate=0, batch=1, warmup=None):
+    '''
+    Compare CSV import with per-object WAPI calls for the same object set
+
+    Objects 1..n are written to a CSV file and imported through
+    nios_csv_import, then objects n+1..2n are created with the WAPI
+    engine so both paths create the same number of new objects.
+
+    Parameters:
+        config (dict): ini configuration
+        op (str): workload name from WORKLOADS with CSV support
+        n (int): number of objects per method
+        options (dict): workload options (base_zone etc.)
+        csv_file (str): CSV file to write, default <op>_import.csv
+        threads, rate, batch, warmup: WAPI engine settings
+
+    Returns:
+        run_time (timedelta): WAPI run time
+        stats (dict): WAPI per operation statistics
+    '''
+    workload = WORKLOADS[op]
+    if 'csv' not in workload:
+        print('Object type {} has no CSV import support.'.format(op))
+        return 0, {}
+    if not csv_file:
+        csv_file = op + '_import.csv'
+
+    # nios_csv_import uses 'version' for the WAPI version
+    csv_config = dict(config)
+    csv_config['version'] = config['api_version']
+
+    setup_workload(config, op, options)
+
+    start = time.perf_counter()
+    count = write_csv(config, op, object_indices(n), options, csv_file)
+    generate_time = time.perf_counter() - start
+    print('Wrote {} {} objects to {} in {:.2f}s'
+          .format(count, op, csv_file, generate_time))
+
+    start = time.perf_counter()
+    csvjob = nios_csv_import.upload_csv(csv_config, csv_file)
+    print('CSV Job Reference: {}'.format(csvjob))
+    status = nios_csv_import.check_csv_status(csv_config, csvjob,
+                                              total_lines=count)
+    import_time = time.perf_counter() - start
+
+    run_time, stats = run_workload(config, op, count, options,
+                                   threads=threads, rate=rate, batch=batch,
+                                   warmup=warmup, start=count + 1,
+                                   setup=False)
+    wapi_time = run_time.total_seconds() or 1
+    wapi_ok = op_totals(stats, op)['success']
+
+    print()
+    print('{:<12}{:>10}{:>12}{:>12}  {}'
+          .format('Method', 'Objects', 'Seconds', 'Objects/s', 'Status'))
+    print('{:<12}{:>10}{:>12.2f}{:>12.1f}  {}'
+          .format('CSV import', count, import_time,
+                  count / (import_time or 1), status))
+    print('{:<12}{:>10}{:>12.2f}{:>12.1f}  {} failed'
+          .format('WAPI', wapi_ok, wapi_time, wapi_ok / wapi_time,
+                  count - wapi_ok))
+
+    return run_time, stats
+
+
+# Objects per self-test run when -n is not given
+SELFTEST_NUMBER = 2000
+
+
+class NullWAPIHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Zero latency WAPI responder used to measure the client's ceiling
+
+    POSTs to objects return 201 and a reference, everything else
+    200 with an empty result, without inspecting the request.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if '/request' in self.path:
+            self.reply(200, b'[]')
+        else:
+            self.reply(201, b'"null/ZG5zLm51bGw:null"')
+
+    def do_GET(self):
+        self.reply(200, b'{"result": []}')
+
+    def do_PUT(self):
+        self.do_POST()
+
+    def do_DELETE(self):
+        self.reply(200, b'"null/ZG5zLm51bGw:null"')
+
+    def log_message(self, *args):
+        pass
+
+
+def start_null_server(processes=2):
+    '''
+    Start the null WAPI responder on a local port
+
+    The listening socket is shared by several forked processes, where
+    fork is available, so the responder is not the bottleneck.
+
+    Parameters:
+        processes (int): number of responder processes
+
+    Returns:
+        port (int): listening port
+        workers (list): responder processes (or threads)
+    '''
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), NullWAPIHandler)
+    server.daemon_threads = True
+    port = server.server_address[1]
+    workers = []
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        for i in range(processes):
+            worker = context.Process(target=server.serve_forever, daemon=True)
+            worker.start()
+            workers.append(worker)
+        server.socket.close()
+    else:
+        worker = threading.Thread(target=server.serve_forever, daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    return port, workers
+
+
+def run_selftest(n, options, threads_list=(1, 5, 20, 50), batch=1,
+                 duration=None, processes=2):
+    '''
+    Run every workload against the null responder
+
+    Reports the maximum calls and objects per second the client
+    achieves for each workload, thread count and batch size, i.e.
+    the ceiling above which GM results say nothing about the GM.
+
+    Parameters:
+        n (int): objects per run
+        options (dict): workload options (base_zone etc.)
+        threads_list (list): thread counts to measure
+        batch (int): also measure this batch size when above 1
+        duration (str): run each cell for this long instead of n
+        processes (int): null responder processes
+
+    Returns:
+        results (list): dicts of op, threads, batch, calls/s, objects/s
+    '''
+    port, workers = start_null_server(processes)
+    config = { 'gm': '127.0.0.1:' + str(port), 'scheme': 'http',
+               'api_version': 'v2.11', 'valid_cert': 'false',
+               'user': 'null', 'pass': 'null', 'network': '10.0.0.0/8',
+               'network6': 'fd00::/32',
+               'sleep': '1' }
+    batches = [ 1 ] if batch <= 1 else [ 1, batch ]
+    results = []
+
+    print('Null responder on port {} ({} processes)'.format(port, len(workers)))
+    # Setup output goes before the table, cells run without setup
+    for op in WORKLOADS:
+        setup_workload(config, op, options)
+    print('{:<14}{:>8}{:>7}{:>10}{:>12}{:>12}{:>10}{:>10}'
+          .format('Workload', 'Threads', 'Batch', 'Calls', 'Calls/s',
+                  'Objects/s', 'p50 ms', 'p99 ms'))
+    try:
+        for op in WORKLOADS:
+            for threads in threads_list:
+                for size in batches:
+                    run_time, stats = run_workload(config, op, n, options,
+                                                   threads=threads,
+                                                   batch=size,
+                                                   warmup=str(threads),
+                                                   duration=duration,
+                                                   setup=False,
+                                                   quiet=True)
+                    op_stats = op_totals(stats, op)
+                    seconds = run_time.total_seconds() or 1
+                    result = { 'op': op, 'threads': threads, 'batch': size,
+                               'calls': op_stats['calls'],
+                               'calls_per_sec': op_stats['calls'] / seconds,
+                               'objects_per_sec': op_stats['objects'] / seconds }
+                    results.append(result)
+                    print('{:<14}{:>8}{:>7}{:>10}{:>12.1f}{:>12.1f}{:>10.2f}{:>10.2f}'
+                          .format(op, threads, size, op_stats['calls'],
+                                  result['calls_per_sec'],
+                                  result['objects_per_sec'],
+                                  percentile(op_stats['latency'], 50) * 1000,
+                                  percentile(op_stats['latency'], 99) * 1000))
+    finally:
+        for worker in workers:
+            if hasattr(worker, 'terminate'):
+                worker.terminate()
+
+    return results
+
+
+def created_ips(text):
+    '''
+    IPv4 addresses from the JSON of created host(s), a single object
+    or a /request result list in create order
+    '''
+    try:
+        created = json.loads(text)
+    except ValueError:
+        return []
+    if isinstance(created, dict):
+        created = [ created ]
+
+    return [ host['ipv4addrs'][0]['ipv4addr'] for host in created
+             if isinstance(host, dict) and host.get('ipv4addrs') ]
+
+
+def scenario_jobs(config, scenario, options):
+    '''
+    Generate jobs for a weighted operation mix
+
+    Host creations are tracked through the engine callback, with the
+    address returned by the create, so that modify and delete
+    operations only target hosts known to exist. Fixed address
+    creations are tracked likewise for fixed_mac. Until an object
+    exists these draws create one.
+    With an interarrival distribution each job is scheduled at the
+    sum of gaps drawn from it.
+
+    Parameters:
+        config (dict): ini configuration
+        scenario (dict): parsed scenario file
+        options (dict): workload options (base_zone etc.)
+
+    Returns:
+        jobs (generator): job dicts
+        callback (func): engine callback tracking live hosts and
+                         fixed addresses
+    '''
+    ops = [ op for op, weight in scenario['mix'] ]
+    weights = [ weight for op, weight in scenario['mix'] ]
+    counters = collections.Counter()
+    live_hosts = []
+    live_fixed = []
+    if scenario['interarrival']:
+        gaps = [ gap for gap, weight in scenario['interarrival'] ]
+        gap_weights = [ weight for gap, weight in scenario['interarrival'] ]
+
+    def callback(result):
+        if result['success'] and result['op'] == 'host':
+            live_hosts.extend(zip(result['indices'], created_ips(result['text'])))
+        elif result['success'] and result['op'] == 'fixedaddress':
+            live_fixed.extend(result['indices'])
+
+    def jobs():
+        at = 0.0
+        for i in object_indices(scenario['number'], scenario['duration']):
+            op = random.choices(ops, weights)[0]
+            index, ip = None, None
+            if op == 'fixed_mac':
+                if live_fixed:
+                    index = random.choice(live_fixed)
+                else:
+                    op = 'fixedaddress'
+            elif op in ('modify', 'delete_hosts'):
+                if not live_hosts:
+                    op = 'host'
+                elif op == 'delete_hosts':
+                    # Swap remove a random live host
+                    pos = random.randrange(len(live_hosts))
+                    live_hosts[pos], live_hosts[-1] = live_hosts[-1], live_hosts[pos]
+                    index, ip = live_hosts.pop()
+                else:
+                    index, ip = random.choice(live_hosts)
+            if index is None:
+                counters[op] += 1
+                index = counters[op]
+            try:
+                job = make_job(config, op, index,
+                               dict(options, host_ip=ip, return_fields=True))
+            except IndexError as err:
+                logging.warning('Stopping scenario: {}'.format(err))
+                print('Address space exhausted for {} objects'.format(op))
+                return
+            if scenario['interarrival']:
+                job['at'] = at
+                at += random.choices(gaps, gap_weights)[0]
+            yield job
+
+    return jobs(), callback
+
+
+def run_scenario(config, scenario_file, options, warmup=None,
+                 duration=None):
+    '''
+    Run a weighted operation mix described by a scenario file
+
+    Parameters:
+        config (dict): ini configuration
+        scenario_file (str): name of scenario file
+        options (dict): workload options (base_zone etc.)
+        warmup (str): warm-up calls or seconds, overrides the scenario
+        duration (str): run time, overrides the scenario
+
+    Returns:
+        run_time (timedelta): measured duration
+        stats (dict): per operation statistics
+    '''
+    scenario = read_scenario(scenario_file)
+    warmup = warmup or scenario['warmup']
+    scenario['duration'] = duration or scenario['duration']
+    total = None if scenario['duration'] else scenario['number']
+    if not scenario['mix']:
+        print('No operations defined in scenario {}'.format(scenario_file))
+        return 0, {}
+
+    for op, weight in scenario['mix']:
+        setup_workload(config, op, options)
+
+    jobs, callback = scenario_jobs(config, scenario, options)
+    jobs = batch_jobs(config, jobs, scenario['batch'])
+    if warmup:
+        warmup = warmup_jobs(config, warmup, options)
+    stats, run_time = run_engine(config, jobs,
+                                 threads=scenario['threads'],
+                                 rate=scenario['rate'],
+                                 total=total,
+                                 callback=callback,
+                                 warmup=warmup)
+    report_stats(stats, run_time)
+
+    return run_time, stats
+
+
+def main():
+    '''
+    Code logic
+    '''
+    exitcode = 0
+    run_time = 0
+
+    # Parse CLI arguments
+    args = parseargs()
+    inifile = args.config[0]
+    n = args.number or 1
+    options = { 'base_zone': args.basezone }
+
+    # Read inifile
+    config = read_ini(inifile)
+    targets = [ (name, read_ini(name)) for name in args.config ]
+    if args.members:
+        targets = [ (member, dict(config, gm=member))
+                    for member in args.members ]
+    targets = [ (name, target, dict(options))
+                for name, target in targets ]
+    if args.zones:
+        for name, target, target_options in targets:
+            make_shards(target, target_options, args.zones,
+                        shard_by=args.shard_by, views=args.shard_views)
+    config, options = targets[0][1], targets[0][2]
+    if len(targets) > 1:
+        # These run against a single grid
+        single = [ flag for flag, value in
+                   (('--health', args.health or args.health_out),
+                    ('--scenario', args.scenario),
+                    ('--csv-import', args.csv_import),
+                    ('--replay', args.replay)) if value ]
+        if single:
+            print('{} cannot be used with several -c files '
+                  'or --members'.format(', '.join(single)))
+            return 1
+
+    if args.profile or args.profile_out:
+        enable_profiling()
+    if args.http_timing:
+        enable_http_timing()
+
+    # Create runs always checkpoint so that --resume has a file to use
+    checkpoint = args.checkpoint
+    if ( not checkpoint and args.record_type in WORKLOADS
+         and WORKLOADS[args.record_type]['method'] != 'GET' ):
+        checkpoint = args.record_type + '_checkpoint.json'
+
+    if args.capture:
+        enable_capture(args.capture)
+    if args.max_rps:
+        enable_rate_limit(args.max_rps, args.burst)
+    if args.health or args.health_out:
+        interval = args.health or 10
+        enable_timeline(interval)
+        health = start_health_sampler(config, interval)
+
+    if args.selftest:
+        threads_list = [ int(t) for t in args.selftest_threads.split(',') ]
+        run_selftest(args.number or SELFTEST_NUMBER, options,
+                     threads_list=threads_list, batch=args.batch,
+                     duration=args.duration)
+    elif args.csv_import:
+        run_time, stats = run_csv_comparison(config, args.record_type, n,
+                                             options,
+                                             csv_file=args.csv_file,
+                                             threads=args.threads,
+                                             rate=args.rate,
+                                             batch=args.batch,
+                                             warmup=args.warmup)
+    elif args.replay:
+        run_time, stats = run_replay(config, args.replay,
+                                     threads=args.threads,
+                                     speed=args.speed)
+    elif args.scenario:
+        run_time, stats = run_scenario(config, args.scenario, options,
+                                       warmup=args.warmup,
+                                       duration=args.duration)
+    elif len(targets) > 1:
+        if args.record_type not in WORKLOADS:
+            print('Object type {} not yet supported.'.format(args.record_type))
+        elif args.members and WORKLOADS[args.record_type]['method'] != 'GET':
+            print('--members only supports read workloads')
+        elif args.verify_only:
+            for name, target, target_options in targets:
+                print('Verifying {}'.format(name))
+                verify_workload(target, args.record_type, object_indices(n),
+                                target_options)
+        else:
+            run_time, stats = run_targets(targets, args.record_type, n,
+                                          threads=args.threads,
+                                          rate=args.rate,
+                                          batch=args.batch,
+                                          warmup=args.warmup,
+                                          duration=args.duration)
+            if args.verify:
+                for name, target, target_options in targets:
+                    count = n
+                    if args.duration:
+                        count = sum(s['objects'] for key, s in stats.items()
+                                    if key.endswith('@' + name))
+                    print('Verifying {}'.format(name))
+                    verify_workload(target, args.record_type,
+                                    object_indices(count), target_options)
+    elif args.verify_only:
+        if args.record_type in WORKLOADS:
+            verify_workload(config, args.record_type, object_indices(n),
+                            options)
+        else:
+            print('Object type {} not yet supported.'.format(args.record_type))
+    elif args.record_type in WORKLOADS:
+        run_time, stats = run_workload(config, args.record_type, n, options,
+                                       threads=args.threads,
+                                       rate=args.rate,
+                                       batch=args.batch,
+                                       warmup=args.warmup,
+                                       duration=args.duration,
+                                       checkpoint=checkpoint,
+                                       resume=args.resume)
+        if args.verify:
+            if args.duration:
+                n = sum(s['objects'] for s in stats.values())
+            verify_workload(config, args.record_type, object_indices(n),
+                            options)
+    else:
+        print('Object type {} not yet supported.'.format(args.record_type))
+    
+    if run_time:
+        calls = sum(op_stats['calls'] for op_stats in stats.values())
+        objects = sum(op_stats['objects'] for op_stats in stats.values())
+        print(f'{calls} API calls ({objects} objects) in {run_time}')
+        ops = float(calls) / run_time.total_seconds()
+        print(f'{ops} average calls per second')
+        if objects != calls:
+            ops = float(objects) / run_time.total_seconds()
+            print(f'{ops} average objects per second')
+
+    if args.health or args.health_out:
+        stop, thread, samples = health
+        stop.set()
+        thread.join()
+        report_timeline(samples, args.health_out)
+    if args.max_rps:
+        report_rate_limit()
+    if args.profile or args.profile_out:
+        report_profile(args.profile_out)
+    close_capture()
 
     return exitcode
 
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+#vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
+'''
+
+ Description:
+
+    Sweep NIOS WAPI performance across object types, thread counts
+    and batch sizes using the nios_api_perf_test engine, and write
+    a Markdown and HTML comparison report.
+
+ Requirements:
+   Python 3.6+
+
+ Author: Chris Marrison
+
+ Date Last Updated: 20210901
+
+ Todo:
+
+ Copyright (c) 2021 Chris Marrison / Infoblox
+
+ Redistribution and use in source and binary forms,
+ with or without modification, are permitted provided
+ that the following conditions are met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+ FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+ COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+ INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+ BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+ LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+ CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+ LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+ ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+ POSSIBILITY OF SUCH DAMAGE.
+
+'''
+__version__ = '0.1.0'
+__author__ = 'Chris Marrison'
+__author_email__ = 'chris@infoblox.com'
+
+import logging
+import argparse
+import ipaddress
+import datetime
+import html
+import collections
+import nios_api_perf_test as perf
+
+
+def parseargs():
+    '''
+    Parse Arguments Using argparse
+
+    Parameters:
+        None
+
+    Returns:
+        Returns parsed arguments
+    '''
+    parse = argparse.ArgumentParser(description='Sweep NIOS WAPI performance across types, threads and batch sizes')
+    parse.add_argument('-c', '--config', type=str, default='gm.ini',
+                        help="Override ini file")
+    parse.add_argument('-r', '--record_types', type=str,
+                        default='host,a,networks,modify,delete_hosts',
+                        help="Comma separated object types to sweep")
+    parse.add_argument('-t', '--threads', type=str, default='1,5,10,20',
+                        help="Comma separated thread counts")
+    parse.add_argument('-b', '--batch', type=str, default='1,10',
+                        help="Comma separated objects per WAPI request")
+    parse.add_argument('-n', '--number', type=int, default=500,
+                        help="Objects per cell")
+    parse.add_argument('--duration', type=str,
+                        help="Run each cell for a time (e.g. 60, 5m) instead of --number objects")
+    parse.add_argument('-z', '--basezone', type=str, default="apitest.poc",
+                        help="Specify base zone for objects")
+    parse.add_argument('-o', '--output', type=str, default='sweep_report',
+                        help="Report file prefix, writes <prefix>.md and <prefix>.html")
+    parse.add_argument('-d', '--debug', action='store_true',
+                        help="Enable debug messages")
+
+    return parse.parse_args()
+
+
+# Workloads acting on the hosts created by the host cells, run last
+HOST_CONSUMERS = [ 'modify', 'delete_hosts' ]
+
+
+def sweep_order(ops):
+    '''
+    Order ops so that hosts are created before they are modified and
+    modified before they are deleted
+    '''
+    creators = [ op for op in ops if op not in HOST_CONSUMERS ]
+
+    return creators + [ op for op in HOST_CONSUMERS if op in ops ]
+
+
+def op_capacity(config, op):
+    '''
+    Objects op can create before config['network'] runs out
+
+    Returns:
+        capacity (int): highest object index, None if op is not
+                        bounded by config['network']
+    '''
+    network = ipaddress.ip_network(config['network'])
+    subnets = network.num_addresses // 256
+    if op in ('networks', 'dhcp_range'):
+        return subnets
+    if op in ('fixedaddress', 'fixed_mac'):
+        return subnets * (perf.DHCP_FIXED[1] - perf.DHCP_FIXED[0] + 1)
+    if op == 'reservation':
+        return subnets * (perf.DHCP_RESERVED[1] - perf.DHCP_RESERVED[0] + 1)
+    if op == 'a':
+        return network.num_addresses - 2
+
+    return None
+
+
+def cell_number(config, op, n, cells):
+    '''
+    Objects per cell so that cells of op fit in config['network']
+
+    Returns:
+        n (int): n, reduced if the cells would exhaust the address
+                 space, 0 if not even one object per cell fits
+    '''
+    capacity = op_capacity(config, op)
+    if capacity is None or n * cells <= capacity:
+        return n
+    fit = capacity // cells
+    print('{} cells of {} {} objects exceed the {} available in {}, '
+          'using {} per cell'.format(cells, n, op, capacity,
+                                     config['network'], fit))
+
+    return fit
+
+
+def run_sweep(config, ops, threads_list, batch_list, n, options,
+              duration=None):
+    '''
+    Run every op across every thread count and batch size
+
+    Create cells each get fresh object indices. modify cells reuse
+    the index ranges of the host cells and delete_hosts cells consume
+    them, so the matrix runs against objects known to exist. These
+    cells cover a whole host cell range, even with duration. Ops
+    bounded by config['network'] have n reduced to fit every cell,
+    with duration cells are skipped once it is exhausted.
+
+    Parameters:
+        config (dict): ini configuration
+        ops (list): workload names
+        threads_list (list): thread counts
+        batch_list (list): batch sizes
+        n (int): objects per cell
+        options (dict): workload options (base_zone etc.)
+        duration (str): run each cell for this long instead
+
+    Returns:
+        cells (list): dicts of op, threads, batch, calls, objects,
+                      failed, seconds, rate and p50/p90/p99 ms
+    '''
+    cells = []
+    next_start = {}
+    host_ranges = []
+    for op in sweep_order(ops):
+        cell_count = 0
+        op_number = n
+        if not duration:
+            op_number = cell_number(config, op, n,
+                                    len(threads_list) * len(batch_list))
+        if not op_number:
+            print('Skipping {}: {} is too small for {} cells'
+                  .format(op, config['network'],
+                          len(threads_list) * len(batch_list)))
+            continue
+        capacity = op_capacity(config, op)
+        for threads in threads_list:
+            for batch in batch_list:
+                cell_duration = duration
+                if op in HOST_CONSUMERS and host_ranges:
+                    if op == 'delete_hosts' and cell_count >= len(host_ranges):
+                        print('No hosts left to delete for {} threads, batch {}'
+                              .format(threads, batch))
+                        continue
+                    start, number = host_ranges[cell_count % len(host_ranges)]
+                    cell_duration = None
+                else:
+                    start, number = next_start.get(op, 1), op_number
+                    if capacity is not None and start > capacity:
+                        print('{} exhausted, skipping {} threads, batch {}'
+                              .format(config['network'], threads, batch))
+                        continue
+                cell_count += 1
+
+                run_time, stats = perf.run_workload(config, op, number, options,
+                                                    threads=threads,
+                                                    batch=batch,
+                                                    duration=cell_duration,
+                                                    start=start,
+                                                    setup=op not in next_start,
+                                                    quiet=True)
+                calls = sum(s['calls'] for s in stats.values())
+                objects = sum(s['objects'] for s in stats.values())
+                failed = sum(s['failed'] for s in stats.values())
+                latency = sum((s['latency'] for s in stats.values()),
+                              collections.Counter())
+                seconds = run_time.total_seconds() or 1
+                next_start[op] = start + objects
+                if op == 'host':
+                    host_ranges.append((start, objects))
+
+                cell = { 'op': op, 'threads': threads, 'batch': batch,
+                         'calls': calls, 'objects': objects,
+                         'failed': failed, 'seconds': seconds,
+                         'rate': objects / seconds,
+                         'p50': perf.percentile(latency, 50) * 1000,
+                         'p90': perf.percentile(latency, 90) * 1000,
+                         'p99': perf.percentile(latency, 99) * 1000 }
+                cells.append(cell)
+                print('{:<14} threads {:>4} batch {:>4}: {:>9.1f} objects/s, '
+                      'p50 {:.1f}ms, p99 {:.1f}ms, {} failed'
+                      .format(op, threads, batch, cell['rate'], cell['p50'],
+                              cell['p99'], failed))
+
+    return cells
+
+
+def cell_table(cells, op, value, fmt='{:.1f}'):
+    '''
+    Rows of threads by columns of batch size for one op and value
+    '''
+    batches = sorted({ c['batch'] for c in cells if c['op'] == op })
+    threads = sorted({ c['threads'] for c in cells if c['op'] == op })
+    index = { (c['threads'], c['batch']): c for c in cells if c['op'] == op }
+    rows = []
+    for t in threads:
+        row = [ str(t) ]
+        for b in batches:
+            cell = index.get((t, b))
+            row.append(fmt.format(cell[value]) if cell else '-')
+        rows.append(row)
+
+    return [ 'threads' ] + [ 'batch {}'.format(b) for b in batches ], rows
+
+
+def markdown_table(header, rows):
+    '''
+    Markdown table text
+    '''
+    lines = [ '| ' + ' | '.join(header) + ' |',
+              '|' + '---:|' * len(header) ]
+    for row in rows:
+        lines.append('| ' + ' | '.join(row) + ' |')
+
+    return '\n'.join(lines)
+
+
+def write_markdown(cells, report_file, title):
+    '''
+    Write the sweep report as Markdown tables
+    '''
+    with open(report_file, 'w') as f:
+        f.write('# {}\n\n'.format(title))
+        for op in dict.fromkeys(c['op'] for c in cells):
+            f.write('## {}\n\n'.format(op))
+            for value, label in (('rate', 'Objects/s'),
+                                 ('p50', 'p50 latency ms'),
+                                 ('p99', 'p99 latency ms')):
+                header, rows = cell_table(cells, op, value)
+                f.write('{}\n\n{}\n\n'.format(label, markdown_table(header, rows)))
+            failed = sum(c['failed'] for c in cells if c['op'] == op)
+            if failed:
+                f.write('{} objects failed\n\n'.format(failed))
+
+    return
+
+
+# Line colours for the batch size series
+SVG_COLOURS = [ '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                '#8c564b' ]
+
+
+def svg_chart(title, xs, series, width=420, height=240):
+    '''
+    Inline SVG line chart
+
+    Parameters:
+        title (str): chart title (the y axis)
+        xs (list): x values (thread counts), plotted evenly spaced
+        series (dict): label to list of y values (None for missing)
+
+    Returns:
+        svg (str)
+    '''
+    left, right, top, bottom = 50, 90, 25, 30
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    y_max = max([ y for ys in series.values() for y in ys if y is not None ]
+                or [ 1 ]) or 1
+    step = plot_w / max(len(xs) - 1, 1)
+
+    def point(i, y):
+        return (left + i * step, top + plot_h - y / y_max * plot_h)
+
+    svg = [ '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+            'font-family="sans-serif" font-size="11">'.format(width, height),
+            '<text x="{}" y="15" font-weight="bold">{}</text>'
+            .format(left, html.escape(title)),
+            '<line x1="{0}" y1="{1}" x2="{0}" y2="{2}" stroke="#888"/>'
+            .format(left, top, top + plot_h),
+            '<line x1="{0}" y1="{1}" x2="{2}" y2="{1}" stroke="#888"/>'
+            .format(left, top + plot_h, left + plot_w),
+            '<text x="{}" y="{}" text-anchor="end">{:.0f}</text>'
+            .format(left - 4, top + 4, y_max),
+            '<text x="{}" y="{}" text-anchor="end">0</text>'
+            .format(left - 4, top + plot_h) ]
+    for i, x in enumerate(xs):
+        svg.append('<text x="{:.0f}" y="{}" text-anchor="middle">{}</text>'
+                   .format(left + i * step, top + plot_h + 14, x))
+    svg.append('<text x="{}" y="{}" text-anchor="middle">threads</text>'
+               .format(left + plot_w / 2, height - 2))
+    for n, (label, ys) in enumerate(series.items()):
+        colour = SVG_COLOURS[n % len(SVG_COLOURS)]
+        points = [ point(i, y) for i, y in enumerate(ys) if y is not None ]
+        svg.append('<polyline fill="none" stroke="{}" stroke-width="2" '
+                   'points="{}"/>'.format(colour, ' '.join(
+                       '{:.1f},{:.1f}'.format(x, y) for x, y in points)))
+        for x, y in points:
+            svg.append('<circle cx="{:.1f}" cy="{:.1f}" r="3" fill="{}"/>'
+                       .format(x, y, colour))
+        svg.append('<text x="{}" y="{}" fill="{}">{}</text>'
+                   .format(left + plot_w + 8, top + 12 + n * 14, colour,
+                           html.escape(label)))
+    svg.append('</svg>')
+
+    return '\n'.join(svg)
+
+
+def write_html(cells, report_file, title):
+    '''
+    Write the sweep report as HTML with inline SVG throughput and
+    latency curves per op
+    '''
+    parts = [ '<!DOCTYPE html>',
+              '<html><head><meta charset="utf-8"><title>{}</title>'
+              .format(html.escape(title)),
+              '<style>body { font-family: sans-serif; } '
+              'table { border-collapse: collapse; margin: 8px 0; } '
+              'td, th { border: 1px solid #ccc; padding: 2px 8px; '
+              'text-align: right; }</style></head><body>',
+              '<h1>{}</h1>'.format(html.escape(title)) ]
+    for op in dict.fromkeys(c['op'] for c in cells):
+        op_cells = [ c for c in cells if c['op'] == op ]
+        threads = sorted({ c['threads'] for c in op_cells })
+        batches = sorted({ c['batch'] for c in op_cells })
+        index = { (c['threads'], c['batch']): c for c in op_cells }
+        parts.append('<h2>{}</h2>'.format(html.escape(op)))
+        for value, label in (('rate', 'Objects/s'), ('p99', 'p99 latency ms')):
+            series = { 'batch {}'.format(b):
+                       [ index[(t, b)][value] if (t, b) in index else None
+                         for t in threads ]
+                       for b in batches }
+            parts.append(svg_chart(label, threads, series))
+        for value, label in (('rate', 'Objects/s'),
+                             ('p50', 'p50 latency ms'),
+                             ('p99', 'p99 latency ms')):
+            header, rows = cell_table(cells, op, value)
+            parts.append('<p>{}</p><table><tr>{}</tr>{}</table>'.format(
+                label,
+                ''.join('<th>{}</th>'.format(html.escape(h)) for h in header),
+                ''.join('<tr>{}</tr>'.format(''.join(
+                    '<td>{}</td>'.format(v) for v in row)) for row in rows)))
+    parts.append('</body></html>')
+
+    with open(report_file, 'w') as f:
+        f.write('\n'.join(parts))
+
+    return
+
+
+def main():
+    '''
+    Code logic
+    '''
+    exitcode = 0
+
+    # Parse CLI arguments
+    args = parseargs()
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    ops = [ op.strip() for op in args.record_types.split(',') ]
+    threads_list = [ int(t) for t in args.threads.split(',') ]
+    batch_list = [ int(b) for b in args.batch.split(',') ]
+    for op in ops:
+        if op not in perf.WORKLOADS:
+            print('Object type {} not yet supported.'.format(op))
+            return 1
+
+    # Read inifile
+    config = perf.read_ini(args.config)
+    options = { 'base_zone': args.basezone }
+
+    cells = run_sweep(config, ops, threads_list, batch_list, args.number,
+                      options, duration=args.duration)
+    if not cells:
+        return 1
+
+    title = 'WAPI sweep of {} ({}) {}'.format(config['gm'], config['api_version'],
+                                              datetime.datetime.now()
+                                              .strftime('%Y-%m-%d %H:%M'))
+    write_markdown(cells, args.output + '.md', title)
+    write_html(cells, args.output + '.html', title)
+    print('Wrote {0}.md and {0}.html'.format(args.output))
+
+    return exitcode
+
+
+### Main ###
+if __name__ == '__main__':
+    exitcode = main()
+    exit(exitcode)
+## End Main ###
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+#vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
+'''
+
+ Description:
+
+    Derive a perf test scenario from an exported NIOS audit log.
+
+    The audit log is streamed once to find the operation mix,
+    rate, burstiness and inter-arrival distribution of object
+    changes, and scenario files for nios_api_perf_test.py -s are
+    written at the requested scales (e.g. 1x, 5x, 10x).
+
+ Requirements:
+   Python 3.6+
+
+ Author: Chris Marrison
+
+ Date Last Updated: 20210901
+
+ Todo:
+
+ Copyright (c) 2021 Chris Marrison / Infoblox
+
+ Redistribution and use in source and binary forms,
+ with or without modification, are permitted provided
+ that the following conditions are met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+ FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+ COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+ INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+ BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+ LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+ CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+ LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+ ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+ POSSIBILITY OF SUCH DAMAGE.
+
+'''
+__version__ = '0.1.0'
+__author__ = 'Chris Marrison'
+__author_email__ = 'chris@infoblox.com'
+
+import logging
+import os
+import argparse
+import datetime
+import collections
+import gzip
+import math
+import re
+
+
+def parseargs():
+    '''
+    Parse Arguments Using argparse
+
+    Parameters:
+        None
+
+    Returns:
+        Returns parsed arguments
+    '''
+    parse = argparse.ArgumentParser(description='Derive a perf test scenario from a NIOS audit log')
+    parse.add_argument('-f', '--file', type=str, default='audit.log',
+                        help="Audit log file (may be gzipped)")
+    parse.add_argument('-o', '--output', type=str,
+                        help="Scenario file prefix (default <file>_scenario)")
+    parse.add_argument('-s', '--scale', type=str, default='1,5,10',
+                        help="Comma separated load multipliers to write scenarios for")
+    parse.add_argument('-a', '--admin', type=str,
+                        help="Only use changes made by this admin (e.g. the provisioning API user)")
+    parse.add_argument('-l', '--latency', type=float, default=0.1,
+                        help="Expected seconds per call, used to size threads")
+    parse.add_argument('-d', '--debug', action='store_true',
+                        help="Enable debug messages")
+
+    return parse.parse_args()
+
+
+# e.g. 2020-07-14 10:22:03.533Z [admin]: Created HostRecord host1.example.com ...
+AUDIT_RE = re.compile(r'^(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)Z?'
+                      r'\s+\[(?P<admin>[^\]]*)\]:\s+'
+                      r'(?P<verb>Created|Modified|Deleted)\s+(?P<type>\w+)')
+
+# Audit log (verb, object type) to perf test workload
+AUDIT_WORKLOADS = {
+    ('created', 'hostrecord'): 'host',
+    ('modified', 'hostrecord'): 'modify',
+    ('deleted', 'hostrecord'): 'delete_hosts',
+    ('created', 'arecord'): 'a',
+    ('created', 'cnamerecord'): 'cname',
+    ('created', 'aaaarecord'): 'aaaa',
+    ('created', 'network'): 'networks',
+    ('created', 'ipv6network'): 'networks6',
+    ('created', 'fixedaddress'): 'fixedaddress',
+    ('modified', 'fixedaddress'): 'fixed_mac',
+    ('created', 'dhcprange'): 'dhcp_range',
+    ('created', 'range'): 'dhcp_range',
+}
+
+# Inter-arrival histogram resolution (~25% per bucket), gaps below
+# GAP_MIN seconds (the log's millisecond resolution) count as 0
+GAP_BASE = 1.25
+GAP_MIN = 0.001
+
+
+def parse_time(timestamp):
+    '''
+    Audit log timestamp to seconds since the epoch
+    '''
+    if '.' in timestamp:
+        fmt = '%Y-%m-%d %H:%M:%S.%f'
+    else:
+        fmt = '%Y-%m-%d %H:%M:%S'
+    dt = datetime.datetime.strptime(timestamp, fmt)
+
+    return dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def gap_bucket(seconds):
+    '''
+    Histogram bucket for an inter-arrival gap, None for zero gaps
+    '''
+    if seconds < GAP_MIN:
+        return None
+
+    return int(math.log(seconds / GAP_MIN, GAP_BASE))
+
+
+def bucket_seconds(bucket):
+    '''
+    Representative (geometric mid point) gap of a bucket in seconds
+    '''
+    if bucket is None:
+        return 0.0
+
+    return GAP_MIN * GAP_BASE ** (bucket + 0.5)
+
+
+def per_second_percentile(per_second, pct):
+    '''
+    Changes in a second at percentile pct of the seconds with changes
+    '''
+    seconds = sum(per_second.values())
+    seen = 0
+    for count in sorted(per_second):
+        seen += per_second[count]
+        if seen >= seconds * pct / 100:
+            return count
+
+    return 0
+
+
+def analyse_audit(audit_file, admin=None):
+    '''
+    Stream an audit log and summarise its object changes
+
+    Memory use is bounded by the number of histogram buckets, not
+    the size of the log.
+
+    Parameters:
+        audit_file (str): audit log, optionally gzipped
+        admin (str): only count changes by this admin
+
+    Returns:
+        summary (dict): lines, events, first, last, mix Counter,
+                        unmapped Counter, gaps histogram, gap mean
+                        and variance, per second counts histogram
+                        and peak per second
+    '''
+    summary = { 'lines': 0, 'events': 0, 'first': None, 'last': None,
+                'mix': collections.Counter(),
+                'unmapped': collections.Counter(),
+                'gaps': collections.Counter(),
+                'gap_mean': 0.0, 'gap_m2': 0.0,
+                'per_second': collections.Counter(), 'peak': 0 }
+    second = None
+    second_count = 0
+
+    if audit_file.endswith('.gz'):
+        f = gzip.open(audit_file, 'rt', errors='replace')
+    else:
+        f = open(audit_file, errors='replace')
+    with f:
+        for line in f:
+            summary['lines'] += 1
+            match = AUDIT_RE.match(line)
+            if not match:
+                continue
+            if admin and match.group('admin') != admin:
+                continue
+            key = (match.group('verb').lower(), match.group('type').lower())
+            if key not in AUDIT_WORKLOADS:
+                summary['unmapped'][' '.join(key)] += 1
+                continue
+            try:
+                now = parse_time(match.group('time'))
+            except ValueError as err:
+                logging.warning('Skipping line {}: {}'.format(summary['lines'], err))
+                continue
+
+            summary['mix'][AUDIT_WORKLOADS[key]] += 1
+            summary['events'] += 1
+            if summary['first'] is None:
+                summary['first'] = now
+            else:
+                # Welford's running mean and variance of the gaps
+                gap = max(now - summary['last'], 0.0)
+                count = summary['events'] - 1
+                delta = gap - summary['gap_mean']
+                summary['gap_mean'] += delta / count
+                summary['gap_m2'] += delta * (gap - summary['gap_mean'])
+                summary['gaps'][gap_bucket(gap)] += 1
+            summary['last'] = max(now, summary['last'] or now)
+
+            if int(now) != second:
+                if second is not None:
+                    summary['per_second'][second_count] += 1
+                second = int(now)
+                second_count = 0
+            second_count += 1
+            summary['peak'] = max(summary['peak'], second_count)
+
+    if second is not None:
+        summary['per_second'][second_count] += 1
+
+    return summary
+
+
+def report_summary(summary):
+    '''
+    Print the traffic profile of an analysed audit log
+    '''
+    events = summary['events']
+    print('{} lines, {} object changes'.format(summary['lines'], events))
+    if not events:
+        return
+
+    duration = summary['last'] - summary['first']
+    print('Span: {} to {} ({:.0f}s)'.format(
+        datetime.datetime.fromtimestamp(summary['first'], datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(summary['last'], datetime.timezone.utc), duration))
+    print()
+    print('{:<14}{:>10}{:>8}'.format('Operation', 'Count', '%'))
+    for op, count in summary['mix'].most_common():
+        print('{:<14}{:>10}{:>8.1f}'.format(op, count, 100 * count / events))
+    for change, count in summary['unmapped'].most_common(5):
+        print('Not mapped to a workload: {} ({})'.format(change, count))
+
+    print()
+    if duration:
+        print('Mean rate: {:.2f} changes/s'.format(events / duration))
+    print('Peak rate: {} changes in one second'.format(summary['peak']))
+    active = sum(summary['per_second'].values())
+    print('Seconds with changes: {} ({:.1f}% of span), changes per such '
+          'second p50 {}, p90 {}, p99 {}'
+          .format(active, 100 * active / max(duration, 1),
+                  per_second_percentile(summary['per_second'], 50),
+                  per_second_percentile(summary['per_second'], 90),
+                  per_second_percentile(summary['per_second'], 99)))
+    if events > 2:
+        stddev = math.sqrt(summary['gap_m2'] / (events - 2))
+        if summary['gap_mean']:
+            # 1 for a Poisson process, higher for bursty traffic
+            print('Inter-arrival mean {:.3f}s, coefficient of variation {:.2f}'
+                  .format(summary['gap_mean'], stddev / summary['gap_mean']))
+        print('Same millisecond as previous change: {:.1f}%'
+              .format(100 * summary['gaps'][None] / (events - 1)))
+
+    return
+
+
+def write_scenario(summary, scenario_file, scale=1, latency=0.1):
+    '''
+    Write a scenario file reproducing the audit log traffic at scale
+
+    The scenario runs scale times as many operations in the span of
+    the log, using the measured inter-arrival distribution with every
+    gap divided by scale.
+
+    Parameters:
+        summary (dict): as returned by analyse_audit
+        scenario_file (str): file to write
+        scale (float): load multiplier
+        latency (float): expected seconds per call, for thread sizing
+
+    Returns:
+        None
+    '''
+    events = summary['events']
+    duration = summary['last'] - summary['first']
+    # Little's law: concurrent calls needed to sustain the peak rate
+    threads = max(5, math.ceil(summary['peak'] * scale * latency))
+
+    with open(scenario_file, 'w') as f:
+        f.write('# Generated by nios_audit_synth.py at {:g}x\n'.format(scale))
+        f.write('# {} changes over {:.0f}s, peak {} per second\n'
+                .format(events, duration, summary['peak']))
+        f.write('# {} seconds with changes, p50 {} p99 {} per second\n'
+                .format(sum(summary['per_second'].values()),
+                        per_second_percentile(summary['per_second'], 50),
+                        per_second_percentile(summary['per_second'], 99)))
+        f.write('[scenario]\n')
+        f.write('number = {}\n'.format(math.ceil(events * scale)))
+        f.write('threads = {}\n'.format(threads))
+        if duration:
+            f.write('# mean rate {:.2f}/s, paced by interarrival\n'
+                    .format(events * scale / duration))
+        f.write('rate = 0\n')
+        f.write('\n[mix]\n')
+        for op, count in summary['mix'].most_common():
+            f.write('{} = {}\n'.format(op, count))
+        f.write('\n[interarrival]\n')
+        buckets = sorted(summary['gaps'], key=lambda b: -1 if b is None else b)
+        for bucket in buckets:
+            f.write('{:.6g} = {}\n'.format(bucket_seconds(bucket) / scale,
+                                           summary['gaps'][bucket]))
+
+    return
+
+
+def main():
+    '''
+    Code logic
+    '''
+    exitcode = 0
+
+    # Parse CLI arguments
+    args = parseargs()
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    summary = analyse_audit(args.file, admin=args.admin)
+    report_summary(summary)
+    if not summary['events']:
+        print('No object changes found in {}'.format(args.file))
+        return 1
+
+    prefix = args.output or os.path.splitext(args.file)[0] + '_scenario'
+    for scale in args.scale.split(','):
+        scenario_file = '{}_{}x.ini'.format(prefix, scale)
+        write_scenario(summary, scenario_file, scale=float(scale),
+                       latency=args.latency)
+        print('Wrote {}'.format(scenario_file))
+
+    return exitcode
+
+
+### Main ###
+if __name__ == '__main__':
+    exitcode = main()
+    exit(exitcode)
+## End Main ###
@@ -55,6 +55,17 @@ import argparse
 import configparser
 import datetime
 import time
+import csv
+import collections
+import zlib
+import ipaddress
+import concurrent.futures
+import uuid
+import io
+import re
+import hashlib
+import array
+import bisect
 
 
 def parseargs():
@@ -78,6 +89,18 @@ def parseargs():
                         help="Get Status of CSV Import Job Specified")
     parse.add_argument('-a', '--action', type=str, 
                         help="Change default action of INSERT (e.g. DELETE) for CSV Import")
+    parse.add_argument('-v', '--validate', action='store_true',
+                        help="Validate and de-duplicate the CSV locally and import the cleaned file")
+    parse.add_argument('--validate-only', action='store_true',
+                        help="Validate and de-duplicate the CSV without importing")
+    parse.add_argument('-r', '--resume', type=str,
+                        help="Resume the CSV Import Job Specified from its last processed line")
+    parse.add_argument('-n', '--shards', type=int, default=1,
+                        help="Split the import into N concurrent CSV jobs")
+    parse.add_argument('-p', '--partition', type=str, choices=['zone', 'network'],
+                        help="Keep rows of the same zone or network in one shard")
+    parse.add_argument('-z', '--gzip', action='store_true',
+                        help="Gzip the upload (GM must accept Content-Encoding: gzip)")
     parse.add_argument('-d', '--debug', action='store_true', 
                         help="Enable debug messages")
 
@@ -136,13 +159,79 @@ def sanitize_filename(pathname):
     return filename
 
 
-def upload_csv(config, file, action="INSERT"):
+class UploadStream:
     '''
-    Upload CSV and execute
+    Iterable multipart/form-data body streamed in chunks
+
+    The file data is read from disk (or taken from an iterable of
+    str/bytes chunks) as the request is sent so the body is never
+    held in memory. With compress the whole body is gzipped on the
+    fly and sent with chunked transfer encoding. When the length is
+    known it is exposed as len so requests sends Content-Length.
+    '''
+    def __init__(self, source, filename, chunk_size=1048576, compress=False):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.preamble = ( '--{}\r\n'
+                          'Content-Disposition: form-data; name="filedata"; '
+                          'filename="{}"\r\n'
+                          'Content-Type: application/octet-stream\r\n\r\n'
+                          .format(self.boundary, filename) ).encode()
+        self.epilogue = '\r\n--{}--\r\n'.format(self.boundary).encode()
+        if isinstance(source, str) and not compress:
+            self.len = ( len(self.preamble) + os.path.getsize(source)
+                       + len(self.epilogue) )
+
+    def file_chunks(self):
+        if isinstance(self.source, str):
+            with open(self.source, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                    yield chunk
+        else:
+            for chunk in self.source:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                yield chunk
+
+    def body_chunks(self):
+        yield self.preamble
+        for chunk in self.file_chunks():
+            self.raw_bytes += len(chunk)
+            yield chunk
+        yield self.epilogue
+
+    def __iter__(self):
+        if self.compress:
+            gzip = zlib.compressobj(wbits=31)
+            for chunk in self.body_chunks():
+                data = gzip.compress(chunk)
+                if data:
+                    self.sent_bytes += len(data)
+                    yield data
+            data = gzip.flush()
+            self.sent_bytes += len(data)
+            yield data
+        else:
+            for chunk in self.body_chunks():
+                self.sent_bytes += len(chunk)
+                yield chunk
+
+
+def create_session(config):
+    '''
+    Create an authenticated WAPI session
+
+    Parameters:
+        config (dict): ini configuration
+
+    Returns:
+        wapi_session (requests.Session): session
     '''
-    url = 'https://' + config['gm'] + '/wapi/' + config['version'] + '/'
-    id = config['user']
-    pw = config['pass']
     if config['valid_cert'] == 'true':
         valid_cert = True
     else:
@@ -152,47 +241,78 @@ def upload_csv(config, file, action="INSERT"):
     if not valid_cert:
         requests.packages.urllib3.disable_warnings()
 
-    # The CSV file we want to import (in the local filesystem).
+    wapi_session = requests.session()
+    wapi_session.auth = (config['user'], config['pass'])
+    wapi_session.verify = valid_cert
+
+    return wapi_session
+
+
+def upload_csv(config, file, action="INSERT", compress=False,
+               chunk_size=1048576, filename=None):
+    '''
+    Upload CSV and execute
+
+    Parameters:
+        config (dict): ini configuration
+        file (str|iter): CSV file name, or iterable of str/bytes chunks
+        action (str): CSV import operation
+        compress (bool): gzip the upload body (Content-Encoding: gzip),
+                         the GM's upload handler must accept this
+        chunk_size (int): bytes read from disk per chunk
+        filename (str): name for the CSV job manager when file is
+                        an iterable
+
+    Returns:
+        csvimporttask (str): csvimporttask object reference
+    '''
+    url = 'https://' + config['gm'] + '/wapi/' + config['version'] + '/'
+
+    # The CSV file (or generator) we want to import.
     csv_data = file
+    if not filename:
+        filename = csv_data if isinstance(csv_data, str) else 'csv_data.csv'
+
+    # One session for all three requests, after uploadinit the
+    # ibapauth cookie it holds authenticates the upload and import.
+    wapi_session = create_session(config)
 
     # Initiate a file upload operation, providing a filename (with
     # alphanumeric, underscore, or periods only) for the CSV job manager.
-    req_params = {'filename': sanitize_filename(csv_data)}
-    r = requests.post(url + 'fileop?_function=uploadinit',
-                    auth=(id, pw),
-                    verify=valid_cert )
+    r = wapi_session.post(url + 'fileop?_function=uploadinit')
     if r.status_code != requests.codes.ok:
         print(r.text)
         exit_msg = 'Error {} initiating upload: {}'
         sys.exit(exit_msg.format(r.status_code, r.reason))
     results = r.json()
 
-    # Save the authentication cookie for use in subsequent requests.
-    ibapauth_cookie = r.cookies['ibapauth']
-
     # Save the returned URL and token for subsequent requests.
     upload_url = results['url']
     upload_token = results['token']
 
-    # Upload the data in the CSV file.
-
-    # Specify a file handle for the file data to be uploaded.
-    req_files = {'filedata': open(csv_data,'rb')}
+    # Stream the CSV data as a multipart body.
+    body = UploadStream(csv_data, sanitize_filename(filename),
+                        chunk_size=chunk_size, compress=compress)
+    headers = { 'Content-Type': body.content_type }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
 
     # Specify the name of the file (not used?).
-    req_params = {'name': sanitize_filename(csv_data)}
-
-    # Use the ibapauth cookie to authenticate instead of userid/password.
-    req_cookies = {'ibapauth': ibapauth_cookie}
+    req_params = {'name': sanitize_filename(filename)}
 
     # Perform the actual upload. (NOTE: It does NOT return JSON results.)
-    r = requests.post(upload_url,
-                    params=req_params,
-                    files=req_files,
-                    cookies=req_cookies,
-                    verify=valid_cert)
+    start = time.perf_counter()
+    r = wapi_session.post(upload_url,
+                          params=req_params,
+                          data=body,
+                          headers=headers)
+    upload_time = time.perf_counter() - start
     if r.status_code != requests.codes.ok:
+        exit_msg = 'Error {} uploading file: {}'
         sys.exit(exit_msg.format(r.status_code, r.reason))
+    print('Uploaded {:.1f} MB ({:.1f} MB sent) in {:.2f}s: {:.1f} MB/s'
+          .format(body.raw_bytes / 1e6, body.sent_bytes / 1e6, upload_time,
+                  body.raw_bytes / 1e6 / (upload_time or 1)))
 
     # Initiate the actual import task.
     req_params = {'token': upload_token,
@@ -200,10 +320,8 @@ def upload_csv(config, file, action="INSERT"):
                 'on_error': 'STOP',
                 'operation': action,
                 'update_method': 'OVERRIDE'}
-    r = requests.post(url + 'fileop?_function=csv_import',
-                    params=req_params,
-                    cookies=req_cookies,
-                    verify=valid_cert)
+    r = wapi_session.post(url + 'fileop?_function=csv_import',
+                          params=req_params)
     if r.status_code != requests.codes.ok:
         print(r.text)
         exit_msg = 'Error {} starting CSV import: {}'
@@ -216,12 +334,84 @@ def upload_csv(config, file, action="INSERT"):
     return csvimporttask
 
 
-def check_csv_status(config, csvjob):
+# Adaptive polling bounds in seconds, config['sleep'] is the maximum
+POLL_MIN = 0.5
+POLL_BACKOFF = 2
+# Slower growth while progress is seen
+POLL_GROWTH = 1.5
+# Consecutive failed status polls before a job is given up on
+POLL_ERRORS = 3
+
+
+def count_data_lines(file):
+    '''
+    Count the data (non header) rows of a CSV import file
+    '''
+    count = 0
+    with open(file, newline='') as f:
+        for row in csv.reader(f):
+            if row and not row[0].lower().startswith('header-'):
+                count += 1
+
+    return count
+
+
+def poll_interval(interval, progressed, eta, max_sleep):
+    '''
+    Next adaptive poll interval
+
+    Polls start fast and back off while no progress is seen. Once
+    progress is being made the interval still grows, more slowly,
+    towards max_sleep, but never beyond the ETA so the end of the
+    job is seen promptly.
+
+    Parameters:
+        interval (float): current interval in seconds
+        progressed (bool): lines were processed since the last poll
+        eta (float): estimated seconds remaining, None if unknown
+        max_sleep (float): maximum interval
+
+    Returns:
+        interval (float): next interval in seconds
+    '''
+    if progressed:
+        interval = min(interval * POLL_GROWTH, max_sleep)
+    else:
+        interval = min(interval * POLL_BACKOFF, max_sleep)
+    if eta is not None:
+        interval = min(interval, max(eta, POLL_MIN))
+
+    return max(interval, POLL_MIN)
+
+
+def format_eta(eta):
+    '''
+    ETA as h:mm:ss, or unknown
+    '''
+    if eta is None:
+        return 'unknown'
+    return str(datetime.timedelta(seconds=int(eta)))
+
+
+def check_csv_status(config, csvjob, total_lines=None, offset=0):
     '''
     Check status of CSV import
+
+    Monitoring ends with WAPI_ERROR only after POLL_ERRORS status
+    polls in a row have failed.
+
+    Parameters:
+        config (dict): ini configuration
+        csvjob (str): csvimporttask reference
+        total_lines (int): data lines in the import, enables the ETA
+        offset (int): lines completed by earlier jobs in a resume chain
+
+    Returns:
+        status (str): final job status
     '''
     status = 'PENDING'
-    sleep = int(config['sleep'])
+    max_sleep = float(config['sleep'] or 10)
+    interval = POLL_MIN
     stop_monitor = ['COMPLETED', 'FAILED', 'STOPPED']
 
     url = ( 'https://' + config['gm'] + '/wapi/' 
@@ -240,17 +430,58 @@ def check_csv_status(config, csvjob):
     wapi_session.auth = (config['user'], config['pass'])
     wapi_session.verify = valid_cert
 
+    monitor_start = time.perf_counter()
+    first_lines, first_time = None, None
+    lines = 0
+    rate = 0.0
+    errors = 0
     while status not in stop_monitor:
-        response = wapi_session.get(url)
-        result = response.json()
-        if response.status_code == requests.codes.ok:
-            status = result['status']
+        try:
+            response = wapi_session.get(url)
+        except requests.exceptions.RequestException as err:
+            error = str(err)
         else:
-            status = 'WAPI_ERROR'
-        print('Status: {}    Processed: {} lines'
-             .format(status, result['lines_processed']), end='\r', flush=True)
+            if response.status_code == requests.codes.ok:
+                error = None
+            else:
+                error = response.text
+        if error is not None:
+            errors += 1
+            if errors >= POLL_ERRORS:
+                status = 'WAPI_ERROR'
+                print()
+                print('Giving up on {}: {}'.format(csvjob, error))
+                break
+            interval = poll_interval(interval, False, None, max_sleep)
+            time.sleep(interval)
+            continue
+        errors = 0
+        now = time.perf_counter()
+        result = response.json()
+        status = result['status']
+
+        # Rate from the first observed progress, not from job start
+        previous = lines
+        lines = int(result['lines_processed'])
+        if first_time is None and lines:
+            first_lines, first_time = lines, now
+        elif first_time is not None and now > first_time:
+            rate = (lines - first_lines) / (now - first_time)
+        eta = None
+        if total_lines and rate:
+            eta = max(total_lines - offset - lines, 0) / rate
+
+        print('Status: {}    Processed: {} lines    {:.1f} lines/s    ETA: {}   '
+             .format(status, offset + lines, rate, format_eta(eta)),
+             end='\r', flush=True)
         if status not in stop_monitor:
-            time.sleep(sleep)
+            interval = poll_interval(interval, lines > previous, eta,
+                                     max_sleep)
+            time.sleep(interval)
+    observed_time = time.perf_counter() - monitor_start
+
+    if status == 'WAPI_ERROR':
+        return status
 
     start_time = datetime.datetime.fromtimestamp(result['start_time'])
     end_time = datetime.datetime.fromtimestamp(result['end_time'])
@@ -260,12 +491,574 @@ def check_csv_status(config, csvjob):
     print()
     print('Final status: {}'.format(status))
     print('Lines completed successfully: {}'.format(lines_success))
+    if offset:
+        print('Lines completed including earlier jobs: {}'
+              .format(offset + lines_success))
     print('Start Time: {}'.format(start_time))
     print('End Time: {}'.format(end_time))
     print('Import took: {}s'.format(run_time))
+    print('Completion observed after {:.2f}s of monitoring'
+          .format(observed_time))
+    print('Import rate: {:.1f} lines/s'
+          .format(int(result['lines_processed'])
+                  / (run_time.total_seconds() or observed_time or 1)))
 
     return status
 
+
+def get_csv_task(config, csvjob):
+    '''
+    Retrieve a csvimporttask object
+
+    Returns:
+        result (dict): csvimporttask fields, empty on error
+    '''
+    url = ( 'https://' + config['gm'] + '/wapi/'
+          + config['version'] + '/' + csvjob )
+    wapi_session = create_session(config)
+    response = wapi_session.get(url)
+    if response.status_code != requests.codes.ok:
+        print(response.text)
+        return {}
+
+    return response.json()
+
+
+def remaining_rows(file, skip, chunk_size=65536):
+    '''
+    Stream a CSV import file from data line skip + 1 onwards
+
+    The header row in effect at the resume point is emitted before
+    the first remaining data row, later header rows pass through.
+
+    Parameters:
+        file (str): CSV import file
+        skip (int): number of data lines to skip
+        chunk_size (int): approximate size of yielded chunks
+
+    Returns:
+        chunks (generator): CSV text chunks
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = None
+    written = None
+    count = 0
+
+    with open(file, newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            if row[0].lower().startswith('header-'):
+                header = row
+                continue
+            count += 1
+            if count <= skip:
+                continue
+            if header is not written:
+                writer.writerow(header)
+                written = header
+            writer.writerow(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def resume_csv(config, file, csvjob, action="INSERT", compress=False):
+    '''
+    Resume a stopped or failed CSV import with a new job
+
+    Lines the job processed successfully (lines_processed less
+    lines_failed, so a failing line is retried) are skipped and the
+    rest of the file, with its header, is uploaded as a new import.
+
+    Parameters:
+        config (dict): ini configuration
+        file (str): the original CSV import file
+        csvjob (str): csvimporttask reference of the previous job
+        action (str): CSV import operation
+        compress (bool): gzip the upload body
+
+    Returns:
+        csvimporttask (str): reference of the new job, None on error
+                             or when no lines remain
+        skip (int): data lines completed by the previous job
+    '''
+    result = get_csv_task(config, csvjob)
+    if not result:
+        return None, 0
+
+    skip = int(result['lines_processed']) - int(result['lines_failed'])
+    total_lines = count_data_lines(file)
+    if skip >= total_lines:
+        print('Previous job completed all {} lines, nothing to resume'
+              .format(total_lines))
+        return None, skip
+    print('Previous job status: {}, resuming after {} lines'
+          .format(result['status'], skip))
+    if result['status'] not in ['FAILED', 'STOPPED']:
+        logging.warning('Job {} is {}, resuming anyway'
+                        .format(csvjob, result['status']))
+
+    csvimporttask = upload_csv(config, remaining_rows(file, skip),
+                               action=action, compress=compress,
+                               filename=file)
+
+    return csvimporttask, skip
+
+
+# Required fields per CSV import object type (header row, '*' stripped)
+CSV_REQUIRED = {
+    'header-hostrecord': ['fqdn'],
+    'header-arecord': ['fqdn', 'address'],
+    'header-aaaarecord': ['fqdn', 'address'],
+    'header-cnamerecord': ['fqdn', 'canonical_name'],
+    'header-ptrrecord': ['dname'],
+    'header-authzone': ['fqdn', 'zone_format'],
+    'header-network': ['address', 'netmask'],
+    'header-ipv6network': ['address', 'cidr'],
+    'header-networkcontainer': ['address', 'netmask'],
+    'header-fixedaddress': ['ip_address'],
+    'header-dhcprange': ['start_address', 'end_address'],
+}
+
+# Fields holding IP addresses (addresses may be a comma separated list)
+CSV_IP_FIELDS = ['address', 'addresses', 'ip_address', 'ipv6_address',
+                 'start_address', 'end_address']
+
+# Fields holding names, the first is also the duplicate name key
+CSV_NAME_FIELDS = ['fqdn', 'canonical_name', 'dname']
+
+FQDN_RE = re.compile(r'^(?=.{1,253}\.?$)(\*\.)?([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.)*'
+                     r'[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.?$', re.IGNORECASE)
+
+# Number of sample lines kept per problem for the report
+VALIDATE_SAMPLES = 5
+
+
+def row_digest(*fields):
+    '''
+    Compact 64 bit digest used for the duplicate indexes
+    '''
+    data = '\x1f'.join(fields).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+class DigestSet:
+    '''
+    Set of 64 bit digests held in sorted array('Q') chunks
+
+    New digests go to a small set which, when full, is sorted into a
+    chunk. Chunks of similar size are merged up to DIGEST_CHUNK
+    entries, so there are few to search and memory is 8 bytes per
+    digest plus the buffer, where a set of ints takes 60-70.
+    '''
+    def __init__(self, buffer_size=4096, chunk_size=1048576):
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.buffer = set()
+        self.chunks = []
+
+    def __contains__(self, digest):
+        if digest in self.buffer:
+            return True
+        for chunk in self.chunks:
+            i = bisect.bisect_left(chunk, digest)
+            if i < len(chunk) and chunk[i] == digest:
+                return True
+        return False
+
+    def add(self, digest):
+        # Callers check membership first, digests are not re-checked
+        self.buffer.add(digest)
+        if len(self.buffer) >= self.buffer_size:
+            self.chunks.append(array.array('Q', sorted(self.buffer)))
+            self.buffer = set()
+            while ( len(self.chunks) > 1
+                    and len(self.chunks[-2]) <= len(self.chunks[-1])
+                    and len(self.chunks[-2]) + len(self.chunks[-1])
+                        <= self.chunk_size ):
+                last = self.chunks.pop()
+                self.chunks[-1] = array.array('Q', sorted(self.chunks[-1] + last))
+
+
+def check_row(header, fields, row):
+    '''
+    Validate a data row against its header
+
+    Returns:
+        problem (str): class of problem, None if valid
+        detail (str): the offending value
+    '''
+    if not header:
+        return 'data row before header', row[0]
+    if row[0].lower() != header[0].lower()[len('header-'):]:
+        return 'row type does not match header', row[0]
+    if len(row) > len(header):
+        return 'more fields than header', str(len(row))
+    row = row + [ '' ] * (len(header) - len(row))
+
+    for field in CSV_REQUIRED.get(header[0].lower(), []):
+        if field in fields and not row[fields.index(field)]:
+            return 'missing ' + field, ''
+    for field in CSV_IP_FIELDS:
+        if field in fields and row[fields.index(field)]:
+            for address in row[fields.index(field)].split(','):
+                try:
+                    ipaddress.ip_address(address.strip())
+                except ValueError:
+                    return 'invalid ' + field, address
+    if 'netmask' in fields and row[fields.index('netmask')]:
+        try:
+            ipaddress.ip_network('0.0.0.0/' + row[fields.index('netmask')])
+        except ValueError:
+            return 'invalid netmask', row[fields.index('netmask')]
+    for field in CSV_NAME_FIELDS:
+        if field in fields and row[fields.index(field)]:
+            if not FQDN_RE.match(row[fields.index(field)]):
+                return 'invalid ' + field, row[fields.index(field)]
+
+    return None, None
+
+
+def validate_csv(file, clean_file=None, reject_file=None):
+    '''
+    Streaming pre-flight validation and de-duplication of a CSV import
+
+    Header rows are checked against the known object types and their
+    required fields, data rows for type, IP address and FQDN syntax.
+    Exact duplicate rows are dropped, rows reusing a name or IP
+    address of the same object type are reported. Duplicates are
+    detected with 64 bit digests kept in DigestSets, so memory grows
+    by about 8 bytes per row and per name and address, regardless of
+    row width, and rows are never held.
+
+    Parameters:
+        file (str): CSV import file
+        clean_file (str): file for valid, de-duplicated rows
+        reject_file (str): file for rejected rows with the reason
+
+    Returns:
+        counts (dict): rows, written, rejected, duplicates,
+                       duplicate_names and duplicate_ips
+    '''
+    counts = collections.Counter()
+    problems = collections.Counter()
+    samples = collections.defaultdict(list)
+    seen_rows = DigestSet()
+    seen_names = DigestSet()
+    seen_ips = DigestSet()
+    header = None
+    fields = []
+    written = None
+    clean = open(clean_file, 'w', newline='') if clean_file else None
+    rejects = open(reject_file, 'w', newline='') if reject_file else None
+    clean_writer = csv.writer(clean) if clean else None
+    reject_writer = csv.writer(rejects) if rejects else None
+
+    def note(problem, line):
+        problems[problem] += 1
+        if len(samples[problem]) < VALIDATE_SAMPLES:
+            samples[problem].append(line)
+
+    try:
+        with open(file, newline='') as f:
+            reader = csv.reader(f)
+            for row in reader:
+                line = reader.line_num
+                if not row:
+                    continue
+                if row[0].lower().startswith('header-'):
+                    header = row
+                    fields = [ field.rstrip('*').lower() for field in row ]
+                    required = CSV_REQUIRED.get(row[0].lower())
+                    if required is None:
+                        note('unknown object type ' + row[0], line)
+                    else:
+                        for field in required:
+                            if field not in fields:
+                                note('{} missing field {}'.format(row[0], field), line)
+                    continue
+
+                counts['rows'] += 1
+                problem, detail = check_row(header, fields, row)
+                if problem:
+                    counts['rejected'] += 1
+                    note(problem, line)
+                    if reject_writer:
+                        reject_writer.writerow([ line, problem, detail ] + row)
+                    continue
+
+                digest = row_digest(*row)
+                if digest in seen_rows:
+                    counts['duplicates'] += 1
+                    note('exact duplicate row', line)
+                    continue
+                seen_rows.add(digest)
+
+                for field in CSV_NAME_FIELDS[:1]:
+                    if field in fields and row[fields.index(field)]:
+                        key = row_digest(row[0], row[fields.index(field)].lower())
+                        if key in seen_names:
+                            counts['duplicate_names'] += 1
+                            note('duplicate name', line)
+                        else:
+                            seen_names.add(key)
+                for field in CSV_IP_FIELDS:
+                    if field in fields and row[fields.index(field)]:
+                        for address in row[fields.index(field)].split(','):
+                            ip = ipaddress.ip_address(address.strip())
+                            key = row_digest(row[0], ip.exploded)
+                            if key in seen_ips:
+                                counts['duplicate_ips'] += 1
+                                note('duplicate ' + field, line)
+                            else:
+                                seen_ips.add(key)
+
+                if clean_writer:
+                    if header is not written:
+                        clean_writer.writerow(header)
+                        written = header
+                    clean_writer.writerow(row)
+                counts['written'] += 1
+    finally:
+        for handle in (clean, rejects):
+            if handle:
+                handle.close()
+
+    print('Rows: {}  Valid: {}  Rejected: {}  Duplicates dropped: {}'
+          .format(counts['rows'], counts['written'], counts['rejected'],
+                  counts['duplicates']))
+    print('Duplicate names: {}  Duplicate IPs: {}'
+          .format(counts['duplicate_names'], counts['duplicate_ips']))
+    for problem, lines in samples.items():
+        print('  {}: {} (lines {})'.format(problem, problems[problem],
+              ', '.join(str(line) for line in lines)))
+
+    return counts
+
+
+def partition_key(header, row, partition):
+    '''
+    Shard key for a data row
+
+    Parameters:
+        header (list): current header row
+        row (list): data row
+        partition (str): 'zone', 'network' or None
+
+    Returns:
+        key (str): key to hash, None to distribute round robin
+    '''
+    fields = [ field.rstrip('*').lower() for field in header ]
+    key = None
+
+    if partition == 'zone' and 'fqdn' in fields:
+        fqdn = row[fields.index('fqdn')]
+        key = fqdn.split('.', 1)[-1].lower()
+    elif partition == 'network':
+        for field in ('address', 'addresses', 'ip_address', 'ipv4addr'):
+            if field in fields and row[fields.index(field)]:
+                address = row[fields.index(field)].split(',')[0].strip()
+                try:
+                    ip = ipaddress.ip_address(address)
+                except ValueError:
+                    break
+                prefix = 24 if ip.version == 4 else 64
+                key = str(ipaddress.ip_network((ip, prefix), strict=False))
+                break
+
+    return key
+
+
+def shard_csv(file, shards, partition=None):
+    '''
+    Split a CSV import file into shards
+
+    The file is streamed, each shard receives the header rows
+    needed for the data rows it holds. Rows are spread round robin
+    or, with partition, by a hash of their zone or network so that
+    objects sharing a zone or network are imported by the same job.
+
+    Parameters:
+        file (str): CSV import file
+        shards (int): number of shards
+        partition (str): 'zone', 'network' or None
+
+    Returns:
+        shard_files (list): names of the shard files
+    '''
+    base, ext = os.path.splitext(file)
+    shard_files = [ '{}_shard{}{}'.format(base, i + 1, ext or '.csv')
+                    for i in range(shards) ]
+    handles = [ open(name, 'w', newline='') for name in shard_files ]
+    writers = [ csv.writer(handle) for handle in handles ]
+    shard_header = [ None ] * shards
+    shard_rows = [ 0 ] * shards
+    header = []
+    count = 0
+
+    try:
+        with open(file, newline='') as f:
+            for row in csv.reader(f):
+                if not row:
+                    continue
+                if row[0].lower().startswith('header-'):
+                    header = row
+                    continue
+                key = partition_key(header, row, partition)
+                if key is None:
+                    shard = count % shards
+                else:
+                    shard = zlib.crc32(key.encode()) % shards
+                if shard_header[shard] is not header:
+                    writers[shard].writerow(header)
+                    shard_header[shard] = header
+                writers[shard].writerow(row)
+                shard_rows[shard] += 1
+                count += 1
+    finally:
+        for handle in handles:
+            handle.close()
+
+    # Partitioning can leave shards empty, don't import those
+    for i in range(shards):
+        if not shard_rows[i]:
+            os.remove(shard_files[i])
+    shard_files = [ name for i, name in enumerate(shard_files) if shard_rows[i] ]
+    print('Split {} rows into {} shards'.format(count, len(shard_files)))
+
+    return shard_files
+
+
+def upload_shards(config, shard_files, action="INSERT", compress=False):
+    '''
+    Upload and start an import job for each shard concurrently
+
+    Returns:
+        csvjobs (list): csvimporttask references in shard order, empty
+                        when there are no shard files
+    '''
+    if not shard_files:
+        print('No data rows to import, no shard files written')
+        return []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shard_files)) as executor:
+        futures = [ executor.submit(upload_csv, config, shard, action=action,
+                                    compress=compress)
+                    for shard in shard_files ]
+        csvjobs = [ future.result() for future in futures ]
+
+    return csvjobs
+
+
+def check_csv_jobs(config, csvjobs, total_lines=None):
+    '''
+    Monitor several CSV import jobs until all have finished
+
+    A job whose status cannot be read POLL_ERRORS times in a row is
+    reported as WAPI_ERROR and no longer polled.
+
+    Parameters:
+        config (dict): ini configuration
+        csvjobs (list): csvimporttask references
+        total_lines (int): data lines across all jobs, enables the ETA
+
+    Returns:
+        statuses (dict): final status per job reference
+    '''
+    max_sleep = float(config['sleep'] or 10)
+    interval = POLL_MIN
+    processed = 0
+    stop_monitor = ['COMPLETED', 'FAILED', 'STOPPED', 'WAPI_ERROR']
+    statuses = { job: 'PENDING' for job in csvjobs }
+    errors = collections.Counter()
+    results = {}
+
+    if config['valid_cert'] == 'true':
+        valid_cert = True
+    else:
+        valid_cert = False
+
+    # Avoid error due to a self-signed cert.
+    if not valid_cert:
+        requests.packages.urllib3.disable_warnings()
+    
+    wapi_session = requests.session()
+    wapi_session.auth = (config['user'], config['pass'])
+    wapi_session.verify = valid_cert
+
+    first_lines, first_time = None, None
+    rate = 0.0
+    while any(status not in stop_monitor for status in statuses.values()):
+        for job in csvjobs:
+            if statuses[job] in stop_monitor:
+                continue
+            url = ( 'https://' + config['gm'] + '/wapi/'
+                  + config['version'] + '/' + job )
+            try:
+                response = wapi_session.get(url)
+            except requests.exceptions.RequestException as err:
+                error = str(err)
+            else:
+                if response.status_code == requests.codes.ok:
+                    results[job] = response.json()
+                    statuses[job] = results[job]['status']
+                    errors[job] = 0
+                    continue
+                error = response.text
+            errors[job] += 1
+            if errors[job] >= POLL_ERRORS:
+                statuses[job] = 'WAPI_ERROR'
+                print()
+                print('Giving up on {}: {}'.format(job, error))
+
+        # Rate from the first observed progress, not from job start
+        now = time.perf_counter()
+        previous = processed
+        processed = sum(int(result.get('lines_processed', 0))
+                        for result in results.values())
+        if first_time is None and processed:
+            first_lines, first_time = processed, now
+        elif first_time is not None and now > first_time:
+            rate = (processed - first_lines) / (now - first_time)
+        eta = None
+        if total_lines and rate:
+            eta = max(total_lines - processed, 0) / rate
+        done = sum(status in stop_monitor for status in statuses.values())
+        print('Jobs finished: {}/{}    Processed: {} lines    {:.1f} lines/s    ETA: {}   '
+              .format(done, len(csvjobs), processed, rate, format_eta(eta)),
+              end='\r', flush=True)
+        if done < len(csvjobs):
+            interval = poll_interval(interval, processed > previous, eta,
+                                     max_sleep)
+            time.sleep(interval)
+
+    print()
+    print('{:<4}{:<12}{:>12}{:>10}{:>12}'
+          .format('#', 'Status', 'Processed', 'Failed', 'Seconds'))
+    for i, job in enumerate(csvjobs, 1):
+        result = results.get(job, {})
+        seconds = ( result.get('end_time', 0) or 0 ) - ( result.get('start_time', 0) or 0 )
+        print('{:<4}{:<12}{:>12}{:>10}{:>12}'
+              .format(i, statuses[job], result.get('lines_processed', 0),
+                      result.get('lines_failed', 0), seconds))
+
+    starts = [ r['start_time'] for r in results.values() if r.get('start_time') ]
+    ends = [ r['end_time'] for r in results.values() if r.get('end_time') ]
+    lines_failed = sum(int(r.get('lines_failed', 0)) for r in results.values())
+    if starts and ends:
+        run_time = max(ends) - min(starts)
+        print('Combined: {} lines, {} failed in {}s ({:.1f} lines/s)'
+              .format(processed, lines_failed, run_time,
+                      processed / (run_time or 1)))
+
+    return statuses
+
+
 def main():
     '''
     Code logic
@@ -280,19 +1073,58 @@ def main():
     # Read inifile
     config = read_ini(inifile)
 
+    if args.validate or args.validate_only:
+        base, ext = os.path.splitext(file)
+        clean_file = base + '_clean' + (ext or '.csv')
+        counts = validate_csv(file, clean_file=clean_file,
+                              reject_file=base + '_rejects' + (ext or '.csv'))
+        if args.validate_only:
+            return exitcode
+        if not counts['written']:
+            print('No valid rows to import')
+            return 1
+        file = clean_file
+
     if args.status:
         status = check_csv_status(config, args.status)
         print('Import status: {}'.format(status))
+    elif args.resume:
+        csvjob, skip = resume_csv(config, file, args.resume,
+                                  action=args.action or 'INSERT',
+                                  compress=args.gzip)
+        if csvjob:
+            print('CSV Job Reference: {} (resumes {})'
+                  .format(csvjob, args.resume))
+            if args.monitor:
+                status = check_csv_status(config, csvjob,
+                                          total_lines=count_data_lines(file),
+                                          offset=skip)
+        elif not skip or skip < count_data_lines(file):
+            exitcode = 1
+    elif args.shards > 1:
+        shard_files = shard_csv(file, args.shards, partition=args.partition)
+        csvjobs = upload_shards(config, shard_files,
+                                action=args.action or 'INSERT',
+                                compress=args.gzip)
+        for shard, csvjob in zip(shard_files, csvjobs):
+            print('CSV Job Reference: {} ({})'.format(csvjob, shard))
+
+        if not csvjobs:
+            exitcode = 1
+        elif args.monitor:
+            check_csv_jobs(config, csvjobs, total_lines=count_data_lines(file))
     else:
         if args.action:
-            csvjob = upload_csv(config, file, action=args.action)
+            csvjob = upload_csv(config, file, action=args.action,
+                                compress=args.gzip)
             print('CSV Job Reference: {}'.format(csvjob))
         else:
-            csvjob = upload_csv(config, file)
+            csvjob = upload_csv(config, file, compress=args.gzip)
             print('CSV Job Reference: {}'.format(csvjob))
 
         if args.monitor:
-            status = check_csv_status(config, csvjob)
+            status = check_csv_status(config, csvjob,
+                                      total_lines=count_data_lines(file))
 
     return exitcode
 